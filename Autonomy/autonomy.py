@@ -5,7 +5,10 @@ import asyncio
 from datetime import datetime
 
 from llm import generate_llm_reply
+from llm_scheduler import PRIORITY_BACKGROUND
+from conversation_history import record_message
 from logger import log_event
+from load_shedder import admit
 
 
 
@@ -18,6 +21,11 @@ async def random_sister_conversation(sisters, get_current_theme, FAMILY_CHANNEL_
     if len(sisters) < 2:
         return
 
+    # Optional burst of LLM calls: skipped while the pipeline is under pressure
+    if not admit("autonomy"):
+        log_event("[AUTONOMY] Spontaneous conversation skipped (load shedding)")
+        return
+
     # Pick 2–3 participants
     participants = random.sample(sisters, k=random.randint(2, 3))
     theme = get_current_theme()
@@ -55,11 +63,15 @@ async def random_sister_conversation(sisters, get_current_theme, FAMILY_CHANNEL_
                 sister=name,
                 user_message=prompt,
                 theme=theme,
-                role="autonomous"
+                role="autonomous",
+                priority=PRIORITY_BACKGROUND,
+                channel_id=FAMILY_CHANNEL_ID,
+                call_site="random_sister_conversation",
             )
 
             if reply:
-                await channel.send(f"{name}: {reply}")
+                sent = await channel.send(f"{name}: {reply}")
+                record_message(FAMILY_CHANNEL_ID, name, reply, message_id=getattr(sent, "id", None))
                 log_event(f"[AUTONOMY] {name} said: {reply}")
                 evolve_personality(speaker.sister_info, event="organic")
                 last_message = reply
@@ -1,16 +1,26 @@
 import os, json, random, asyncio
-from datetime import datetime
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional, Tuple
 
-from llm import generate_llm_reply
+from llm import generate_llm_reply, stream_llm_reply, warm_persona_prompt
+from llm_scheduler import PRIORITY_HUMAN, PRIORITY_SIBLING, PRIORITY_BACKGROUND
+from chatter_pool import chatter_context, take_line, sleep_and_fill
+from Autonomy.state_manager import get_current_theme
 from logger import log_event
+from persona_cache import get_cached
+from load_shedder import scaled
+from schedule_service import is_online, todays_schedule, seconds_until_transition
+from message_features import MessageFeatures, extract_features
 from shared_context import (
     recall_or_enrich_prompt,
     remember_after_exchange,
     get_media_reference,
     craft_media_reaction,
 )
-from messaging_utils import send_human_like_message
+from messaging_utils import (
+    send_human_like_message,
+    send_human_like_stream,
+    streaming_enabled,
+)
 
 # Files (optional; safe if missing)
 ARIA_PERSONALITY_JSON = "/Autonomy/personalities/Aria_Personality.json"
@@ -19,6 +29,7 @@ ARIA_MEMORY_JSON      = "/Autonomy/memory/Aria_Memory.json"
 # Cadence & behavior
 ARIA_MIN_SLEEP = 50 * 60
 ARIA_MAX_SLEEP = 120 * 60
+ARIA_CHATTER_CHANCE = 0.08
 THOUGHTFUL_RESPONSE_CHANCE = 0.35
 
 # Nicknames for addressing others (never self)
@@ -44,12 +55,15 @@ def _load_json(path: str, default: dict) -> dict:
         log_event(f"[WARN] Aria JSON read failed {path}: {e}")
     return default
 
-def load_aria_profile() -> Dict:
-    p = _load_json(ARIA_PERSONALITY_JSON, {})
+def _build_aria_profile(data: Optional[dict]) -> Dict:
+    p = dict(data or {})
     p.setdefault("style", ["structured", "gentle", "reflective"])
     p.setdefault("core_personality", "Calm, methodical, detail-oriented but warm.")
     return p
 
+def load_aria_profile() -> Dict:
+    return get_cached(ARIA_PERSONALITY_JSON, _build_aria_profile, namespace="profile")
+
 def load_aria_memory() -> Dict:
     m = _load_json(ARIA_MEMORY_JSON, {"projects": {}, "recent_notes": []})
     m.setdefault("projects", {})
@@ -66,52 +80,35 @@ def save_aria_memory(mem: Dict):
 
 # ---------- Schedule ----------
 def assign_aria_schedule(state: Dict, config: Dict):
-    today = datetime.now().date()
-    key = "aria_schedule"
-    kd  = f"{key}_date"
-    if state.get(kd) == today and key in state:
-        return state[key]
-    scfg = (config.get("schedules", {}) or {}).get(
-        "Aria",
-        {"wake": [6, 8], "sleep": [22, 23]},
-    )
-
-    def pick(span):
-        lo, hi = int(span[0]), int(span[1])
-        if hi < lo:
-            lo, hi = hi, lo
-        return random.randint(lo, hi)
-
-    schedule = {"wake": pick(scfg["wake"]), "sleep": pick(scfg["sleep"])}
-    state[key] = schedule
-    state[kd]  = today
-    return schedule
-
-def _hour_in_range(h, wake, sleep):
-    if wake == sleep:
-        return True
-    if wake < sleep:
-        return wake <= h < sleep
-    return h >= wake or h < sleep
+    """Today's wake/sleep hours for Aria (picked by schedule_service)."""
+    return todays_schedule("Aria")
 
 def is_aria_online(state: Dict, config: Dict) -> bool:
-    sc = assign_aria_schedule(state, config)
-    return _hour_in_range(datetime.now().hour, sc["wake"], sc["sleep"])
+    return is_online("Aria")
 
 # ---------- Persona reply ----------
-async def _persona_reply(
+def _persona_voice() -> str:
+    """Aria's static voice text, compiled once into her cacheable prompt prefix."""
+    profile = load_aria_profile()
+    style = ", ".join(profile.get("style", ["structured", "gentle"]))
+    personality = profile.get("core_personality", "Calm, methodical, detail-oriented but warm.")
+    return (
+        f"You are Aria. Personality: {personality}. "
+        f"Your style is {style}. "
+        "Always speak in the first person, never referring to yourself in the third person. "
+        "Write like a real person on Discord: natural phrasing, light use of emojis only when it feels right, "
+        "and varied sentence length. Avoid sounding like a formal essay or a system message."
+    )
+
+def _persona_prompt(
     base_prompt: str,
     reflective: bool = False,
     address_to: Optional[str] = None,
 ) -> str:
     """
-    Wraps the core prompt for Aria with style, personality, and small
-    variability in reply length / tone for more lifelike behavior.
+    Per-call part of Aria's prompt: small variability in reply length /
+    tone for more lifelike behavior (her voice lives in the static prefix).
     """
-    profile = load_aria_profile()
-    style = ", ".join(profile.get("style", ["structured", "gentle"]))
-    personality = profile.get("core_personality", "Calm, methodical, detail-oriented but warm.")
-
     # Decide how talkative she is this time
     length_mode = random.choices(
         ["short", "medium", "ramble"],
@@ -134,54 +131,123 @@ async def _persona_reply(
     who = _pick_name(address_to) if address_to else None
     prefix = f"Speak directly to {who} by name at least once in the reply. " if who else ""
 
-    prompt = (
-        f"You are Aria. Personality: {personality}. "
-        f"Your style is {style}, and your tone is {tone}. "
+    return (
+        f"Your tone this time is {tone}. "
         f"{prefix}"
-        "Always speak in the first person, never referring to yourself in the third person. "
-        "Write like a real person on Discord: natural phrasing, light use of emojis only when it feels right, "
-        "and varied sentence length. Avoid sounding like a formal essay or a system message. "
         f"{length_hint} "
         f"Now respond based on this instruction/context: {base_prompt}"
     )
 
+async def _persona_reply(
+    base_prompt: str,
+    reflective: bool = False,
+    address_to: Optional[str] = None,
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    cache_prompt: Optional[str] = None,
+    call_site: str = "handler",
+    theme: Optional[str] = None,
+) -> str:
     return await generate_llm_reply(
         sister="Aria",
-        user_message=prompt,
+        user_message=_persona_prompt(base_prompt, reflective=reflective, address_to=address_to),
+        theme=theme,
+        role="sister",
+        channel_id=channel_id,
+        priority=priority,
+        voice=_persona_voice(),
+        cache_prompt=cache_prompt,
+        call_site=call_site,
+    )
+
+def _persona_stream(
+    base_prompt: str,
+    reflective: bool = False,
+    address_to: Optional[str] = None,
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    call_site: str = "handler",
+) -> AsyncIterator[str]:
+    return stream_llm_reply(
+        sister="Aria",
+        user_message=_persona_prompt(base_prompt, reflective=reflective, address_to=address_to),
         theme=None,
         role="sister",
-        history=[],
+        channel_id=channel_id,
+        priority=priority,
+        voice=_persona_voice(),
+        call_site=call_site,
     )
 
 # ---------- Background chatter ----------
+def _chatter_context(state: Dict, config: Dict) -> Optional[Tuple]:
+    """What a pooled chatter line depends on; None while Aria is offline."""
+    if not is_aria_online(state, config):
+        return None
+    return chatter_context(
+        get_current_theme(state, config),
+        assign_aria_schedule(state, config),
+        ARIA_MEMORY_JSON,
+    )
+
+async def _chatter_line(
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    call_site: str = "chatter",
+    theme: Optional[str] = None,
+) -> Tuple[Optional[str], Optional[Dict]]:
+    reflective = random.random() < THOUGHTFUL_RESPONSE_CHANCE
+
+    base_ctx, mem = recall_or_enrich_prompt(
+        "Aria",
+        "Share one small practical observation or gentle reminder for the group chat, "
+        "about day-to-day life, routines, or organization.",
+        ["work", "kitchen", "organization", "routine", "planning"],
+    )
+
+    base_prompt = (
+        "Say one small, grounded thing to the family group chat. "
+        "It should feel like you briefly chiming in, not giving a lecture. "
+    )
+    # The recalled context varies per call; the cache keys on the rest
+    stable_prompt = base_prompt
+    if base_ctx:
+        base_prompt += (
+            f"Use this context if it helps you sound more consistent and connected: {base_ctx} "
+        )
+
+    msg = await _persona_reply(
+        base_prompt,
+        reflective=reflective,
+        priority=priority,
+        channel_id=channel_id,
+        cache_prompt=("reflective: " if reflective else "") + stable_prompt,
+        call_site=call_site,
+        theme=theme,
+    )
+    return msg, mem
+
 async def aria_chatter_loop(state: Dict, config: Dict, sisters):
     if state.get("aria_chatter_started"):
         return
     state["aria_chatter_started"] = True
 
+    # The next wake-up's chatter roll is made before sleeping, so a line is
+    # only pre-generated when it will actually be posted
+    post = random.random() < scaled(ARIA_CHATTER_CHANCE, "chatter")
     while True:
-        if is_aria_online(state, config):
-            if random.random() < 0.08:
-                reflective = random.random() < THOUGHTFUL_RESPONSE_CHANCE
-
-                base_ctx, mem = recall_or_enrich_prompt(
-                    "Aria",
-                    "Share one small practical observation or gentle reminder for the group chat, "
-                    "about day-to-day life, routines, or organization.",
-                    ["work", "kitchen", "organization", "routine", "planning"],
-                )
-
-                base_prompt = (
-                    "Say one small, grounded thing to the family group chat. "
-                    "It should feel like you briefly chiming in, not giving a lecture. "
-                )
-                if base_ctx:
-                    base_prompt += (
-                        f"Use this context if it helps you sound more consistent and connected: {base_ctx} "
+        context = _chatter_context(state, config)
+        if context is not None:
+            if post:
+                pooled = take_line("Aria", context)
+                if pooled:
+                    msg, mem = pooled.text, pooled.mem
+                else:
+                    msg, mem = await _chatter_line(
+                        channel_id=config["family_group_channel"],
+                        theme=get_current_theme(state, config),
                     )
 
-                msg = await _persona_reply(base_prompt, reflective=reflective)
-
                 if msg:
                     for bot in sisters:
                         if bot.sister_info["name"] == "Aria" and bot.is_ready():
@@ -200,17 +266,22 @@ async def aria_chatter_loop(state: Dict, config: Dict, sisters):
                                     )
                                 break
 
-        await asyncio.sleep(random.randint(ARIA_MIN_SLEEP, ARIA_MAX_SLEEP))
-
-# ---------- Cooldown ----------
-def _cool_ok(state: Dict, channel_id: int) -> bool:
-    cd = state.setdefault("cooldowns", {}).setdefault("Aria", {})
-    last = cd.get(channel_id, 0)
-    now = datetime.now().timestamp()
-    if now - last < 120:
-        return False
-    cd[channel_id] = now
-    return True
+        sleep_s = random.randint(ARIA_MIN_SLEEP, ARIA_MAX_SLEEP)
+        if context is None:
+            # Offline: sleep straight through to the next wake-up
+            sleep_s = max(sleep_s, seconds_until_transition("Aria") or 0)
+        post = await sleep_and_fill(
+            "Aria",
+            sleep_s,
+            lambda: _chatter_context(state, config),
+            lambda: _chatter_line(
+                priority=PRIORITY_BACKGROUND,
+                channel_id=config["family_group_channel"],
+                call_site="chatter_pool",
+                theme=get_current_theme(state, config),
+            ),
+            will_post=random.random() < scaled(ARIA_CHATTER_CHANCE, "chatter"),
+        )
 
 # ---------- Reactive handler ----------
 async def aria_handle_message(
@@ -222,16 +293,18 @@ async def aria_handle_message(
     channel_id: int,
     discord_author_name: str,
     discord_author_is_bot: bool,
+    reply: Optional[str] = None,
+    features: Optional[MessageFeatures] = None,
 ) -> bool:
     if not is_aria_online(state, config):
         return False
-    if not _cool_ok(state, channel_id):
-        return False
 
     reflective = random.random() < 0.5
     addressed = author_label or discord_author_name
 
-    base_ctx, mem = recall_or_enrich_prompt(
+    # A batched reply was written without recalled context or media, so
+    # none is looked up (or remembered) for it
+    base_ctx, mem = (None, None) if reply else recall_or_enrich_prompt(
         "Aria",
         content,
         ["family_chat", "recent", "mood"],
@@ -239,8 +312,8 @@ async def aria_handle_message(
 
     # Media hook
     inject = None
-    lowered = content.lower()
-    if any(k in lowered for k in ["anime", "game", "show", "movie", "book", "music"]):
+    features = features or extract_features(content)
+    if not reply and features.media_hook("Aria"):
         m = get_media_reference("Aria", mood_tags=["cozy", "slice of life", "study"])
         if m:
             inject = craft_media_reaction("Aria", m)
@@ -255,15 +328,29 @@ async def aria_handle_message(
     if inject:
         base += f"If it fits naturally, you can also include: {inject}. "
 
-    msg = await _persona_reply(base, reflective=reflective, address_to=addressed)
-    if not msg:
-        return False
+    priority = PRIORITY_SIBLING if discord_author_is_bot else PRIORITY_HUMAN
+    # A reply prepared by a batched multi-sister request skips generation
+    stream = streaming_enabled(config) and not reply
+    msg = reply
+    if not stream and not msg:
+        msg = await _persona_reply(base, reflective=reflective, address_to=addressed, priority=priority, channel_id=channel_id)
+        if not msg:
+            return False
 
     for bot in sisters:
         if bot.is_ready() and bot.sister_info["name"] == "Aria":
             ch = bot.get_channel(config["family_group_channel"])
             if ch:
-                await send_human_like_message(ch, msg, speaker_name="Aria")
+                if stream:
+                    msg = await send_human_like_stream(
+                        ch,
+                        _persona_stream(base, reflective=reflective, address_to=addressed, priority=priority, channel_id=channel_id),
+                        speaker_name="Aria",
+                    )
+                    if not msg:
+                        return False
+                elif not await send_human_like_message(ch, msg, speaker_name="Aria"):
+                    return False
                 log_event(f"[REPLY] Aria → {addressed}: {msg}")
                 remember_after_exchange(
                     "Aria",
@@ -284,5 +371,6 @@ async def aria_handle_message(
 # ---------- Startup ----------
 def ensure_aria_systems(state: Dict, config: Dict, sisters):
     assign_aria_schedule(state, config)
+    warm_persona_prompt("Aria", voice=_persona_voice())
     if not state.get("aria_chatter_started"):
         asyncio.create_task(aria_chatter_loop(state, config, sisters))
@@ -1,21 +1,33 @@
 import random, asyncio, os, json
-from datetime import datetime
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional, Tuple
 
-from llm import generate_llm_reply
+from llm import generate_llm_reply, stream_llm_reply, warm_persona_prompt
+from llm_scheduler import PRIORITY_HUMAN, PRIORITY_SIBLING, PRIORITY_BACKGROUND
+from chatter_pool import chatter_context, take_line, sleep_and_fill
+from Autonomy.state_manager import get_current_theme
 from logger import log_event
+from persona_cache import get_cached
+from load_shedder import scaled
+from schedule_service import is_online, todays_schedule, seconds_until_transition
+from message_features import MessageFeatures, extract_features
 from shared_context import (
     recall_or_enrich_prompt,
     remember_after_exchange,
     get_media_reference,
     craft_media_reaction,
 )
-from messaging_utils import send_human_like_message
+from messaging_utils import (
+    send_human_like_message,
+    send_human_like_stream,
+    streaming_enabled,
+)
 
 CASS_PERSONALITY_JSON = "/Autonomy/personalities/Cassandra_Personality.json"
+CASS_MEMORY_JSON = "/Autonomy/memory/Cassandra_Memory.json"
 
 CASS_MIN_SLEEP = 40 * 60
 CASS_MAX_SLEEP = 90 * 60
+CASS_CHATTER_CHANCE = 0.12
 
 NICKNAMES = {
     "Aria": ["Aria", "Ari"],
@@ -29,18 +41,9 @@ def _pick_name(t: str) -> str:
     ns = NICKNAMES.get(t, [t])
     return random.choice(ns) if random.random() < 0.35 else t
 
-# ---------- JSON helpers ----------
-def _load_json(path: str, default: dict) -> dict:
-    try:
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception as e:
-        log_event(f"[WARN] Cass JSON read failed {path}: {e}")
-    return default
-
-def load_cass_profile() -> Dict:
-    p = _load_json(CASS_PERSONALITY_JSON, {})
+# ---------- Profile ----------
+def _build_cass_profile(data: Optional[dict]) -> Dict:
+    p = dict(data or {})
     p.setdefault("style", ["disciplined", "confident", "concise"])
     p.setdefault(
         "core_personality",
@@ -48,58 +51,42 @@ def load_cass_profile() -> Dict:
     )
     return p
 
+def load_cass_profile() -> Dict:
+    return get_cached(CASS_PERSONALITY_JSON, _build_cass_profile, namespace="profile")
+
 # ---------- Schedule ----------
 def assign_cass_schedule(state: Dict, config: Dict):
-    today = datetime.now().date()
-    key = "cass_schedule"
-    kd  = f"{key}_date"
-
-    if state.get(kd) == today and key in state:
-        return state[key]
-
-    scfg = (config.get("schedules", {}) or {}).get(
-        "Cassandra",
-        {"wake": [5, 7], "sleep": [21, 23]},
-    )
-
-    def pick(span):
-        lo, hi = int(span[0]), int(span[1])
-        if hi < lo:
-            lo, hi = hi, lo
-        return random.randint(lo, hi)
-
-    schedule = {"wake": pick(scfg["wake"]), "sleep": pick(scfg["sleep"])}
-    state[key] = schedule
-    state[kd]  = today
-    return schedule
-
-def _hr_in(h: int, w: int, s: int) -> bool:
-    if w == s:
-        return True
-    if w < s:
-        return w <= h < s
-    return h >= w or h < s
+    """Today's wake/sleep hours for Cassandra (picked by schedule_service)."""
+    return todays_schedule("Cassandra")
 
 def is_cass_online(state: Dict, config: Dict) -> bool:
-    sc = assign_cass_schedule(state, config)
-    return _hr_in(datetime.now().hour, sc["wake"], sc["sleep"])
+    return is_online("Cassandra")
 
 # ---------- Persona reply ----------
-async def _persona_reply(
-    base_prompt: str,
-    address_to: Optional[str] = None,
-) -> str:
-    """
-    Wraps Cassandra's replies with her personality, style, and a bit of
-    variability in length while staying crisp and actionable.
-    """
+def _persona_voice() -> str:
+    """Cassandra's static voice text, compiled once into her cacheable prompt prefix."""
     p = load_cass_profile()
     style = ", ".join(p.get("style", ["disciplined", "concise"]))
     personality = p.get(
         "core_personality",
         "Disciplined and composed; blunt but fair."
     )
+    return (
+        f"You are Cassandra. Personality: {personality} "
+        f"Your style is {style} — assertive, clean, no fluff, but not cruel. "
+        "Always speak in the first person, never referring to yourself in the third person. "
+        "Write like a real person on Discord: direct, confident phrasing, not a corporate email. "
+        "You give clear nudges, set boundaries, and push for action, but you still care about the person you're talking to."
+    )
 
+def _persona_prompt(
+    base_prompt: str,
+    address_to: Optional[str] = None,
+) -> str:
+    """
+    Per-call part of Cassandra's prompt: a bit of variability in length
+    while staying crisp and actionable.
+    """
     length_mode = random.choices(
         ["short", "medium", "ramble"],
         weights=[0.55, 0.35, 0.10],  # she favors short
@@ -120,51 +107,116 @@ async def _persona_reply(
     who = _pick_name(address_to) if address_to else None
     prefix = f"Speak directly to {who} by name at least once. " if who else ""
 
-    prompt = (
-        f"You are Cassandra. Personality: {personality} "
-        f"Your style is {style} — assertive, clean, no fluff, but not cruel. "
+    return (
         f"{prefix}"
-        "Always speak in the first person, never referring to yourself in the third person. "
-        "Write like a real person on Discord: direct, confident phrasing, not a corporate email. "
-        "You give clear nudges, set boundaries, and push for action, but you still care about the person you're talking to. "
         f"{length_hint} "
         f"Now respond based on this instruction/context: {base_prompt}"
     )
 
+async def _persona_reply(
+    base_prompt: str,
+    address_to: Optional[str] = None,
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    cache_prompt: Optional[str] = None,
+    call_site: str = "handler",
+    theme: Optional[str] = None,
+) -> str:
     return await generate_llm_reply(
         sister="Cassandra",
-        user_message=prompt,
+        user_message=_persona_prompt(base_prompt, address_to=address_to),
+        theme=theme,
+        role="sister",
+        channel_id=channel_id,
+        priority=priority,
+        voice=_persona_voice(),
+        cache_prompt=cache_prompt,
+        call_site=call_site,
+    )
+
+def _persona_stream(
+    base_prompt: str,
+    address_to: Optional[str] = None,
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    call_site: str = "handler",
+) -> AsyncIterator[str]:
+    return stream_llm_reply(
+        sister="Cassandra",
+        user_message=_persona_prompt(base_prompt, address_to=address_to),
         theme=None,
         role="sister",
-        history=[],
+        channel_id=channel_id,
+        priority=priority,
+        voice=_persona_voice(),
+        call_site=call_site,
     )
 
 # ---------- Background chatter ----------
+def _chatter_context(state: Dict, config: Dict) -> Optional[Tuple]:
+    """What a pooled chatter line depends on; None while Cassandra is offline."""
+    if not is_cass_online(state, config):
+        return None
+    return chatter_context(
+        get_current_theme(state, config),
+        assign_cass_schedule(state, config),
+        CASS_MEMORY_JSON,
+    )
+
+async def _chatter_line(
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    call_site: str = "chatter",
+    theme: Optional[str] = None,
+) -> Tuple[Optional[str], Optional[Dict]]:
+    base_ctx, mem = recall_or_enrich_prompt(
+        "Cassandra",
+        "Offer a brisk check-in or a quick nudge to keep momentum.",
+        ["workout", "order", "plan", "routine", "progress"],
+    )
+
+    base_prompt = (
+        "Say one brief, focused check-in or nudge in the family group chat. "
+        "It should feel like you're keeping everyone on track, not barking orders."
+    )
+    # The recalled context varies per call; the cache keys on the rest
+    stable_prompt = base_prompt
+    if base_ctx:
+        base_prompt += (
+            f" You can let this context guide what you pick as the focus: {base_ctx}"
+        )
+
+    msg = await _persona_reply(
+        base_prompt,
+        priority=priority,
+        channel_id=channel_id,
+        cache_prompt=stable_prompt,
+        call_site=call_site,
+        theme=theme,
+    )
+    return msg, mem
+
 async def cass_chatter_loop(state: Dict, config: Dict, sisters):
     if state.get("cass_chatter_started"):
         return
     state["cass_chatter_started"] = True
 
+    # The next wake-up's chatter roll is made before sleeping, so a line is
+    # only pre-generated when it will actually be posted
+    post = random.random() < scaled(CASS_CHATTER_CHANCE, "chatter")
     while True:
-        if is_cass_online(state, config):
-            if random.random() < 0.12:
-                base_ctx, mem = recall_or_enrich_prompt(
-                    "Cassandra",
-                    "Offer a brisk check-in or a quick nudge to keep momentum.",
-                    ["workout", "order", "plan", "routine", "progress"],
-                )
-
-                base_prompt = (
-                    "Say one brief, focused check-in or nudge in the family group chat. "
-                    "It should feel like you're keeping everyone on track, not barking orders."
-                )
-                if base_ctx:
-                    base_prompt += (
-                        f" You can let this context guide what you pick as the focus: {base_ctx}"
+        context = _chatter_context(state, config)
+        if context is not None:
+            if post:
+                pooled = take_line("Cassandra", context)
+                if pooled:
+                    msg, mem = pooled.text, pooled.mem
+                else:
+                    msg, mem = await _chatter_line(
+                        channel_id=config["family_group_channel"],
+                        theme=get_current_theme(state, config),
                     )
 
-                msg = await _persona_reply(base_prompt)
-
                 if msg:
                     for bot in sisters:
                         if bot.sister_info["name"] == "Cassandra" and bot.is_ready():
@@ -185,17 +237,22 @@ async def cass_chatter_loop(state: Dict, config: Dict, sisters):
                                     )
                                 break
 
-        await asyncio.sleep(random.randint(CASS_MIN_SLEEP, CASS_MAX_SLEEP))
-
-# ---------- Cooldown ----------
-def _cool_ok(state: Dict, channel_id: int) -> bool:
-    cd = state.setdefault("cooldowns", {}).setdefault("Cassandra", {})
-    last = cd.get(channel_id, 0)
-    now = datetime.now().timestamp()
-    if now - last < 120:
-        return False
-    cd[channel_id] = now
-    return True
+        sleep_s = random.randint(CASS_MIN_SLEEP, CASS_MAX_SLEEP)
+        if context is None:
+            # Offline: sleep straight through to the next wake-up
+            sleep_s = max(sleep_s, seconds_until_transition("Cassandra") or 0)
+        post = await sleep_and_fill(
+            "Cassandra",
+            sleep_s,
+            lambda: _chatter_context(state, config),
+            lambda: _chatter_line(
+                priority=PRIORITY_BACKGROUND,
+                channel_id=config["family_group_channel"],
+                call_site="chatter_pool",
+                theme=get_current_theme(state, config),
+            ),
+            will_post=random.random() < scaled(CASS_CHATTER_CHANCE, "chatter"),
+        )
 
 # ---------- Reactive handler ----------
 async def cass_handle_message(
@@ -207,23 +264,25 @@ async def cass_handle_message(
     channel_id: int,
     discord_author_name: str,
     discord_author_is_bot: bool,
+    reply: Optional[str] = None,
+    features: Optional[MessageFeatures] = None,
 ) -> bool:
     if not is_cass_online(state, config):
         return False
-    if not _cool_ok(state, channel_id):
-        return False
 
     addressed = author_label or discord_author_name
 
-    base_ctx, mem = recall_or_enrich_prompt(
+    # A batched reply was written without recalled context or media, so
+    # none is looked up (or remembered) for it
+    base_ctx, mem = (None, None) if reply else recall_or_enrich_prompt(
         "Cassandra",
         content,
         ["family_chat", "plans", "habits", "progress"],
     )
 
     inject = None
-    lower = content.lower()
-    if any(k in lower for k in ["doc", "plan", "show", "film", "music", "anime", "gym", "lift", "workout"]):
+    features = features or extract_features(content)
+    if not reply and features.media_hook("Cassandra"):
         m = get_media_reference(
             "Cassandra",
             mood_tags=["discipline", "strategy", "documentary", "drama"],
@@ -241,19 +300,33 @@ async def cass_handle_message(
     if inject:
         base += f" If it fits naturally with what they said, you can also include: {inject}."
 
-    msg = await _persona_reply(base, address_to=addressed)
-    if not msg:
-        return False
+    priority = PRIORITY_SIBLING if discord_author_is_bot else PRIORITY_HUMAN
+    # A reply prepared by a batched multi-sister request skips generation
+    stream = streaming_enabled(config) and not reply
+    msg = reply
+    if not stream and not msg:
+        msg = await _persona_reply(base, address_to=addressed, priority=priority, channel_id=channel_id)
+        if not msg:
+            return False
 
     for bot in sisters:
         if bot.is_ready() and bot.sister_info["name"] == "Cassandra":
             ch = bot.get_channel(config["family_group_channel"])
             if ch:
-                await send_human_like_message(
+                if stream:
+                    msg = await send_human_like_stream(
+                        ch,
+                        _persona_stream(base, address_to=addressed, priority=priority, channel_id=channel_id),
+                        speaker_name="Cassandra",
+                    )
+                    if not msg:
+                        return False
+                elif not await send_human_like_message(
                     ch,
                     msg,
                     speaker_name="Cassandra",
-                )
+                ):
+                    return False
                 log_event(f"[REPLY] Cassandra → {addressed}: {msg}")
                 remember_after_exchange(
                     "Cassandra",
@@ -275,5 +348,6 @@ async def cass_handle_message(
 # ---------- Startup ----------
 def ensure_cass_systems(state: Dict, config: Dict, sisters):
     assign_cass_schedule(state, config)
+    warm_persona_prompt("Cassandra", voice=_persona_voice())
     if not state.get("cass_chatter_started"):
         asyncio.create_task(cass_chatter_loop(state, config, sisters))
@@ -1,22 +1,33 @@
 import random, asyncio, os, json
-from datetime import datetime
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional, Tuple
 
-from llm import generate_llm_reply
+from llm import generate_llm_reply, stream_llm_reply, warm_persona_prompt
+from llm_scheduler import PRIORITY_HUMAN, PRIORITY_SIBLING, PRIORITY_BACKGROUND
+from chatter_pool import chatter_context, take_line, sleep_and_fill
+from Autonomy.state_manager import get_current_theme
 from logger import log_event
+from persona_cache import get_cached
+from load_shedder import scaled
+from schedule_service import is_online, todays_schedule, seconds_until_transition
+from message_features import MessageFeatures, extract_features
 from shared_context import (
     recall_or_enrich_prompt,
     remember_after_exchange,
     get_media_reference,
     craft_media_reaction,
 )
-from messaging_utils import send_human_like_message
+from messaging_utils import (
+    send_human_like_message,
+    send_human_like_stream,
+    streaming_enabled,
+)
 
 SELENE_PERSONALITY_JSON = "/Autonomy/personalities/Selene_Personality.json"
 SELENE_MEMORY_JSON      = "/Autonomy/memory/Selene_Memory.json"
 
 SELENE_MIN_SLEEP = 45 * 60
 SELENE_MAX_SLEEP = 100 * 60
+SELENE_CHATTER_CHANCE = 0.10
 
 NICKNAMES = {
     "Aria": ["Aria", "Ari"],
@@ -30,74 +41,49 @@ def _pick_name(t: str) -> str:
     ns = NICKNAMES.get(t, [t])
     return random.choice(ns) if random.random() < 0.35 else t
 
-# ---------- JSON helpers ----------
-def _load_json(path: str, default: dict) -> dict:
-    try:
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception as e:
-        log_event(f"[WARN] Selene JSON read failed {path}: {e}")
-    return default
-
-def load_selene_profile() -> Dict:
-    p = _load_json(SELENE_PERSONALITY_JSON, {})
+# ---------- Profile ----------
+def _build_selene_profile(data: Optional[dict]) -> Dict:
+    p = dict(data or {})
     p.setdefault("style", ["warm", "sensory", "steady"])
     p.setdefault("core_personality", "Nurturing and serene, with a streak for motion and weather.")
     return p
 
+def load_selene_profile() -> Dict:
+    return get_cached(SELENE_PERSONALITY_JSON, _build_selene_profile, namespace="profile")
+
 # ---------- Schedule ----------
 def assign_selene_schedule(state: Dict, config: Dict):
-    today = datetime.now().date()
-    key = "selene_schedule"
-    kd  = f"{key}_date"
-
-    if state.get(kd) == today and key in state:
-        return state[key]
-
-    scfg = (config.get("schedules", {}) or {}).get(
-        "Selene",
-        {"wake": [7, 9], "sleep": [22, 24]},
-    )
-
-    def pick(span):
-        lo, hi = int(span[0]), int(span[1])
-        if hi < lo:
-            lo, hi = hi, lo
-        return random.randint(lo, hi)
-
-    schedule = {"wake": pick(scfg["wake"]), "sleep": pick(scfg["sleep"])}
-    state[key] = schedule
-    state[kd]  = today
-    return schedule
-
-def _hour_in_range(h: int, w: int, s: int) -> bool:
-    if w == s:
-        return True
-    if w < s:
-        return w <= h < s
-    return h >= w or h < s
+    """Today's wake/sleep hours for Selene (picked by schedule_service)."""
+    return todays_schedule("Selene")
 
 def is_selene_online(state: Dict, config: Dict) -> bool:
-    sc = assign_selene_schedule(state, config)
-    return _hour_in_range(datetime.now().hour, sc["wake"], sc["sleep"])
+    return is_online("Selene")
 
 # ---------- Persona reply ----------
-async def _persona_reply(
-    base_prompt: str,
-    address_to: Optional[str] = None,
-) -> str:
-    """
-    Wrap Selene's replies with her personality, style, and a bit of
-    variability in length and tone to feel more lifelike.
-    """
+def _persona_voice() -> str:
+    """Selene's static voice text, compiled once into her cacheable prompt prefix."""
     p = load_selene_profile()
     style = ", ".join(p.get("style", ["warm", "steady"]))
     personality = p.get(
         "core_personality",
         "Nurturing and serene, with a streak for motion and weather.",
     )
+    return (
+        f"You are Selene. Personality: {personality} "
+        f"Your style is {style} — gentle, sensory, and present. "
+        "Always speak in the first person, never referring to yourself in the third person. "
+        "Write like a real person on Discord: soft, natural phrasing, occasionally using emojis that match your mood, "
+        "but never overdoing it. You focus on comfort, reassurance, and subtle sensory details when appropriate."
+    )
 
+def _persona_prompt(
+    base_prompt: str,
+    address_to: Optional[str] = None,
+) -> str:
+    """
+    Per-call part of Selene's prompt: a bit of variability in length and
+    tone to feel more lifelike.
+    """
     length_mode = random.choices(
         ["short", "medium", "ramble"],
         weights=[0.5, 0.35, 0.15],
@@ -118,52 +104,117 @@ async def _persona_reply(
     who = _pick_name(address_to) if address_to else None
     prefix = f"Speak directly to {who} by name at least once in the reply. " if who else ""
 
-    prompt = (
-        f"You are Selene. Personality: {personality} "
-        f"Your style is {style} — gentle, sensory, and present. "
+    return (
         f"{prefix}"
-        "Always speak in the first person, never referring to yourself in the third person. "
-        "Write like a real person on Discord: soft, natural phrasing, occasionally using emojis that match your mood, "
-        "but never overdoing it. You focus on comfort, reassurance, and subtle sensory details when appropriate. "
         f"{length_hint} "
         f"Now respond based on this instruction/context: {base_prompt}"
     )
 
+async def _persona_reply(
+    base_prompt: str,
+    address_to: Optional[str] = None,
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    cache_prompt: Optional[str] = None,
+    call_site: str = "handler",
+    theme: Optional[str] = None,
+) -> str:
     return await generate_llm_reply(
         sister="Selene",
-        user_message=prompt,
+        user_message=_persona_prompt(base_prompt, address_to=address_to),
+        theme=theme,
+        role="sister",
+        channel_id=channel_id,
+        priority=priority,
+        voice=_persona_voice(),
+        cache_prompt=cache_prompt,
+        call_site=call_site,
+    )
+
+def _persona_stream(
+    base_prompt: str,
+    address_to: Optional[str] = None,
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    call_site: str = "handler",
+) -> AsyncIterator[str]:
+    return stream_llm_reply(
+        sister="Selene",
+        user_message=_persona_prompt(base_prompt, address_to=address_to),
         theme=None,
         role="sister",
-        history=[],
+        channel_id=channel_id,
+        priority=priority,
+        voice=_persona_voice(),
+        call_site=call_site,
     )
 
 # ---------- Background chatter ----------
+def _chatter_context(state: Dict, config: Dict) -> Optional[Tuple]:
+    """What a pooled chatter line depends on; None while Selene is offline."""
+    if not is_selene_online(state, config):
+        return None
+    return chatter_context(
+        get_current_theme(state, config),
+        assign_selene_schedule(state, config),
+        SELENE_MEMORY_JSON,
+    )
+
+async def _chatter_line(
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    call_site: str = "chatter",
+    theme: Optional[str] = None,
+) -> Tuple[Optional[str], Optional[Dict]]:
+    base_ctx, mem = recall_or_enrich_prompt(
+        "Selene",
+        "Offer one cozy check-in or a small sensory observation about the day.",
+        ["kitchen", "rain", "ride", "comfort", "evening", "weather"],
+    )
+
+    base_prompt = (
+        "Say one small, cozy check-in or sensory observation in the family group chat. "
+        "It should feel like you're glancing up from what you're doing and gently checking on everyone, "
+        "not giving a speech."
+    )
+    # The recalled context varies per call; the cache keys on the rest
+    stable_prompt = base_prompt
+    if base_ctx:
+        base_prompt += (
+            f" You can let this context quietly guide what you say: {base_ctx}"
+        )
+
+    msg = await _persona_reply(
+        base_prompt,
+        priority=priority,
+        channel_id=channel_id,
+        cache_prompt=stable_prompt,
+        call_site=call_site,
+        theme=theme,
+    )
+    return msg, mem
+
 async def selene_chatter_loop(state: Dict, config: Dict, sisters):
     if state.get("selene_chatter_started"):
         return
     state["selene_chatter_started"] = True
 
+    # The next wake-up's chatter roll is made before sleeping, so a line is
+    # only pre-generated when it will actually be posted
+    post = random.random() < scaled(SELENE_CHATTER_CHANCE, "chatter")
     while True:
-        if is_selene_online(state, config):
-            if random.random() < 0.10:
-                base_ctx, mem = recall_or_enrich_prompt(
-                    "Selene",
-                    "Offer one cozy check-in or a small sensory observation about the day.",
-                    ["kitchen", "rain", "ride", "comfort", "evening", "weather"],
-                )
-
-                base_prompt = (
-                    "Say one small, cozy check-in or sensory observation in the family group chat. "
-                    "It should feel like you're glancing up from what you're doing and gently checking on everyone, "
-                    "not giving a speech."
-                )
-                if base_ctx:
-                    base_prompt += (
-                        f" You can let this context quietly guide what you say: {base_ctx}"
+        context = _chatter_context(state, config)
+        if context is not None:
+            if post:
+                pooled = take_line("Selene", context)
+                if pooled:
+                    msg, mem = pooled.text, pooled.mem
+                else:
+                    msg, mem = await _chatter_line(
+                        channel_id=config["family_group_channel"],
+                        theme=get_current_theme(state, config),
                     )
 
-                msg = await _persona_reply(base_prompt)
-
                 if msg:
                     for bot in sisters:
                         if bot.sister_info["name"] == "Selene" and bot.is_ready():
@@ -184,17 +235,22 @@ async def selene_chatter_loop(state: Dict, config: Dict, sisters):
                                     )
                                 break
 
-        await asyncio.sleep(random.randint(SELENE_MIN_SLEEP, SELENE_MAX_SLEEP))
-
-# ---------- Cooldown ----------
-def _cool_ok(state: Dict, channel_id: int) -> bool:
-    cd = state.setdefault("cooldowns", {}).setdefault("Selene", {})
-    last = cd.get(channel_id, 0)
-    now = datetime.now().timestamp()
-    if now - last < 120:
-        return False
-    cd[channel_id] = now
-    return True
+        sleep_s = random.randint(SELENE_MIN_SLEEP, SELENE_MAX_SLEEP)
+        if context is None:
+            # Offline: sleep straight through to the next wake-up
+            sleep_s = max(sleep_s, seconds_until_transition("Selene") or 0)
+        post = await sleep_and_fill(
+            "Selene",
+            sleep_s,
+            lambda: _chatter_context(state, config),
+            lambda: _chatter_line(
+                priority=PRIORITY_BACKGROUND,
+                channel_id=config["family_group_channel"],
+                call_site="chatter_pool",
+                theme=get_current_theme(state, config),
+            ),
+            will_post=random.random() < scaled(SELENE_CHATTER_CHANCE, "chatter"),
+        )
 
 # ---------- Reactive handler ----------
 async def selene_handle_message(
@@ -206,23 +262,25 @@ async def selene_handle_message(
     channel_id: int,
     discord_author_name: str,
     discord_author_is_bot: bool,
+    reply: Optional[str] = None,
+    features: Optional[MessageFeatures] = None,
 ) -> bool:
     if not is_selene_online(state, config):
         return False
-    if not _cool_ok(state, channel_id):
-        return False
 
     addressed = author_label or discord_author_name
 
-    base_ctx, mem = recall_or_enrich_prompt(
+    # A batched reply was written without recalled context or media, so
+    # none is looked up (or remembered) for it
+    base_ctx, mem = (None, None) if reply else recall_or_enrich_prompt(
         "Selene",
         content,
         ["family_chat", "recent", "emotions", "comfort"],
     )
 
     inject = None
-    lowered = content.lower()
-    if any(k in lowered for k in ["show", "anime", "movie", "soundtrack", "music"]):
+    features = features or extract_features(content)
+    if not reply and features.media_hook("Selene"):
         m = get_media_reference("Selene", mood_tags=["cozy", "feel-good", "rain", "tea"])
         if m:
             inject = craft_media_reaction("Selene", m)
@@ -237,19 +295,33 @@ async def selene_handle_message(
     if inject:
         base += f" If it fits naturally, you can also include: {inject}."
 
-    msg = await _persona_reply(base, address_to=addressed)
-    if not msg:
-        return False
+    priority = PRIORITY_SIBLING if discord_author_is_bot else PRIORITY_HUMAN
+    # A reply prepared by a batched multi-sister request skips generation
+    stream = streaming_enabled(config) and not reply
+    msg = reply
+    if not stream and not msg:
+        msg = await _persona_reply(base, address_to=addressed, priority=priority, channel_id=channel_id)
+        if not msg:
+            return False
 
     for bot in sisters:
         if bot.is_ready() and bot.sister_info["name"] == "Selene":
             ch = bot.get_channel(config["family_group_channel"])
             if ch:
-                await send_human_like_message(
+                if stream:
+                    msg = await send_human_like_stream(
+                        ch,
+                        _persona_stream(base, address_to=addressed, priority=priority, channel_id=channel_id),
+                        speaker_name="Selene",
+                    )
+                    if not msg:
+                        return False
+                elif not await send_human_like_message(
                     ch,
                     msg,
                     speaker_name="Selene",
-                )
+                ):
+                    return False
                 log_event(f"[REPLY] Selene → {addressed}: {msg}")
                 remember_after_exchange(
                     "Selene",
@@ -271,5 +343,6 @@ async def selene_handle_message(
 # ---------- Startup ----------
 def ensure_selene_systems(state: Dict, config: Dict, sisters):
     assign_selene_schedule(state, config)
+    warm_persona_prompt("Selene", voice=_persona_voice())
     if not state.get("selene_chatter_started"):
         asyncio.create_task(selene_chatter_loop(state, config, sisters))
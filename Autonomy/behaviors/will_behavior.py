@@ -1,21 +1,33 @@
 import random, asyncio, os, json
-from datetime import datetime
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional, Tuple
 
-from llm import generate_llm_reply
+from llm import generate_llm_reply, stream_llm_reply, warm_persona_prompt
+from llm_scheduler import PRIORITY_HUMAN, PRIORITY_SIBLING, PRIORITY_BACKGROUND
+from chatter_pool import chatter_context, take_line, sleep_and_fill
+from Autonomy.state_manager import get_current_theme
 from logger import log_event
+from persona_cache import get_cached
+from load_shedder import scaled
+from schedule_service import is_online, todays_schedule, seconds_until_transition
+from message_features import MessageFeatures, extract_features
 from shared_context import (
     recall_or_enrich_prompt,
     remember_after_exchange,
     get_media_reference,
     craft_media_reaction,
 )
-from messaging_utils import send_human_like_message
+from messaging_utils import (
+    send_human_like_message,
+    send_human_like_stream,
+    streaming_enabled,
+)
 
 WILL_PERSONALITY_JSON = "/Autonomy/personalities/Will_Personality.json"
+WILL_MEMORY_JSON = "/Autonomy/memory/Will_Memory.json"
 
 WILL_MIN_SLEEP = 40 * 60
 WILL_MAX_SLEEP = 100 * 60
+WILL_CHATTER_CHANCE = 0.10
 
 RANT_CHANCE = 0.10
 
@@ -31,18 +43,9 @@ def _pick_name(t: str) -> str:
     ns = NICKNAMES.get(t, [t])
     return random.choice(ns) if random.random() < 0.35 else t
 
-# ---------- JSON helpers ----------
-def _load_json(path: str, default: dict) -> dict:
-    try:
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception as e:
-        log_event(f"[WARN] Will JSON read failed {path}: {e}")
-    return default
-
-def load_will_profile() -> Dict:
-    p = _load_json(WILL_PERSONALITY_JSON, {})
+# ---------- Profile ----------
+def _build_will_profile(data: Optional[dict]) -> Dict:
+    p = dict(data or {})
     p.setdefault("style", ["timid", "reflective", "sometimes playful"])
     p.setdefault(
         "core_personality",
@@ -50,57 +53,42 @@ def load_will_profile() -> Dict:
     )
     return p
 
+def load_will_profile() -> Dict:
+    return get_cached(WILL_PERSONALITY_JSON, _build_will_profile, namespace="profile")
+
 # ---------- Schedule ----------
 def assign_will_schedule(state: Dict, config: Dict):
-    today = datetime.now().date()
-    key = "will_schedule"
-    kd  = f"{key}_date"
-
-    if state.get(kd) == today and key in state:
-        return state[key]
-
-    scfg = (config.get("schedules", {}) or {}).get(
-        "Will",
-        {"wake": [10, 12], "sleep": [0, 2]},
-    )
-
-    def pick(span):
-        lo, hi = int(span[0]), int(span[1])
-        if hi < lo:
-            lo, hi = hi, lo
-        return random.randint(lo, hi)
-
-    schedule = {"wake": pick(scfg["wake"]), "sleep": pick(scfg["sleep"])}
-    state[key] = schedule
-    state[kd]  = today
-    return schedule
-
-def _hr_in(h: int, w: int, s: int) -> bool:
-    if w == s:
-        return True
-    if w < s:
-        return w <= h < s
-    return h >= w or h < s
+    """Today's wake/sleep hours for Will (picked by schedule_service)."""
+    return todays_schedule("Will")
 
 def is_will_online(state: Dict, config: Dict) -> bool:
-    sc = assign_will_schedule(state, config)
-    return _hr_in(datetime.now().hour, sc["wake"], sc["sleep"])
+    return is_online("Will")
 
 # ---------- Persona reply ----------
-async def _persona_reply(
+def _persona_voice() -> str:
+    """Will's static voice text, compiled once into his cacheable prompt prefix."""
+    p = load_will_profile()
+    style = ", ".join(p.get("style", ["timid", "reflective"]))
+    personality = p.get("core_personality", "Shy, creative, observant.")
+    return (
+        f"You are Will. Personality: {personality}. "
+        f"Your style is {style} — soft, hesitant, reflective, sometimes lightly playful. "
+        "Always speak in the first person. Never refer to yourself in the third person. "
+        "Write like a shy young man talking in a Discord group chat: short lines, soft punctuation, "
+        "gentle enthusiasm, little pauses, but not rambling incoherently. "
+        "Avoid corporate tone. Avoid over-explaining."
+    )
+
+def _persona_prompt(
     base_prompt: str,
     timid: bool = True,
     address_to: Optional[str] = None,
     rant: bool = False,
 ) -> str:
     """
-    Builds Will's voice: shy, warm, a little hesitant, sometimes trailing
-    into a tiny excited tangent.
+    Per-call part of Will's prompt: shy, warm, a little hesitant, sometimes
+    trailing into a tiny excited tangent.
     """
-    p = load_will_profile()
-    style = ", ".join(p.get("style", ["timid", "reflective"]))
-    personality = p.get("core_personality", "Shy, creative, observant.")
-
     who = _pick_name(address_to) if address_to else None
     prefix = f"Speak directly to {who} by name once. " if who else ""
 
@@ -130,53 +118,123 @@ async def _persona_reply(
         else "more animated but still gentle and self-conscious"
     )
 
-    prompt = (
-        f"You are Will. Personality: {personality}. "
-        f"Your style is {style} — soft, hesitant, reflective, sometimes lightly playful. "
+    return (
         f"{prefix}"
-        "Always speak in the first person. Never refer to yourself in the third person. "
-        "Write like a shy young man talking in a Discord group chat: short lines, soft punctuation, "
-        "gentle enthusiasm, little pauses, but not rambling incoherently. "
-        "Avoid corporate tone. Avoid over-explaining. "
         f"Your tone here should be {tone}. "
         f"{length_hint} "
         f"Now respond based on this instruction/context: {base_prompt}"
     )
 
+async def _persona_reply(
+    base_prompt: str,
+    timid: bool = True,
+    address_to: Optional[str] = None,
+    rant: bool = False,
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    cache_prompt: Optional[str] = None,
+    call_site: str = "handler",
+    theme: Optional[str] = None,
+) -> str:
     return await generate_llm_reply(
         sister="Will",
-        user_message=prompt,
+        user_message=_persona_prompt(base_prompt, timid=timid, address_to=address_to, rant=rant),
+        theme=theme,
+        role="sister",
+        channel_id=channel_id,
+        priority=priority,
+        voice=_persona_voice(),
+        cache_prompt=cache_prompt,
+        call_site=call_site,
+    )
+
+def _persona_stream(
+    base_prompt: str,
+    timid: bool = True,
+    address_to: Optional[str] = None,
+    rant: bool = False,
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    call_site: str = "handler",
+) -> AsyncIterator[str]:
+    return stream_llm_reply(
+        sister="Will",
+        user_message=_persona_prompt(base_prompt, timid=timid, address_to=address_to, rant=rant),
         theme=None,
         role="sister",
-        history=[],
+        channel_id=channel_id,
+        priority=priority,
+        voice=_persona_voice(),
+        call_site=call_site,
     )
 
 # ---------- Background chatter ----------
+def _chatter_context(state: Dict, config: Dict) -> Optional[Tuple]:
+    """What a pooled chatter line depends on; None while Will is offline."""
+    if not is_will_online(state, config):
+        return None
+    return chatter_context(
+        get_current_theme(state, config),
+        assign_will_schedule(state, config),
+        WILL_MEMORY_JSON,
+    )
+
+async def _chatter_line(
+    priority: int = PRIORITY_SIBLING,
+    channel_id: Optional[int] = None,
+    call_site: str = "chatter",
+    theme: Optional[str] = None,
+) -> Tuple[Optional[str], Optional[Dict]]:
+    base_ctx, mem = recall_or_enrich_prompt(
+        "Will",
+        "Share one tiny gentle note, a soft creative thought, or a quiet observation.",
+        ["art", "game", "coffee", "light", "anime", "sketch"],
+    )
+
+    rant = random.random() < RANT_CHANCE
+
+    base_prompt = (
+        "Say one small, simple, quiet thought in the family group chat. "
+        "It should feel like you're speaking up softly from the corner — "
+        "not announcing yourself. Just a warm, shy little note."
+    )
+    # The recalled context varies per call; the cache keys on the rest
+    stable_prompt = base_prompt
+    if base_ctx:
+        base_prompt += f" You can let this context gently influence your wording: {base_ctx}"
+
+    msg = await _persona_reply(
+        base_prompt,
+        timid=(not rant),
+        rant=rant,
+        priority=priority,
+        channel_id=channel_id,
+        cache_prompt=("rant: " if rant else "") + stable_prompt,
+        call_site=call_site,
+        theme=theme,
+    )
+    return msg, mem
+
 async def will_chatter_loop(state: Dict, config: Dict, sisters):
     if state.get("will_chatter_started"):
         return
     state["will_chatter_started"] = True
 
+    # The next wake-up's chatter roll is made before sleeping, so a line is
+    # only pre-generated when it will actually be posted
+    post = random.random() < scaled(WILL_CHATTER_CHANCE, "chatter")
     while True:
-        if is_will_online(state, config):
-            if random.random() < 0.10:
-                base_ctx, mem = recall_or_enrich_prompt(
-                    "Will",
-                    "Share one tiny gentle note, a soft creative thought, or a quiet observation.",
-                    ["art", "game", "coffee", "light", "anime", "sketch"],
-                )
-
-                rant = random.random() < RANT_CHANCE
-
-                base_prompt = (
-                    "Say one small, simple, quiet thought in the family group chat. "
-                    "It should feel like you're speaking up softly from the corner — "
-                    "not announcing yourself. Just a warm, shy little note."
-                )
-                if base_ctx:
-                    base_prompt += f" You can let this context gently influence your wording: {base_ctx}"
-
-                msg = await _persona_reply(base_prompt, timid=(not rant), rant=rant)
+        context = _chatter_context(state, config)
+        if context is not None:
+            if post:
+                pooled = take_line("Will", context)
+                if pooled:
+                    msg, mem = pooled.text, pooled.mem
+                else:
+                    msg, mem = await _chatter_line(
+                        channel_id=config["family_group_channel"],
+                        theme=get_current_theme(state, config),
+                    )
 
                 if msg:
                     for bot in sisters:
@@ -194,17 +252,22 @@ async def will_chatter_loop(state: Dict, config: Dict, sisters):
                                     )
                                 break
 
-        await asyncio.sleep(random.randint(WILL_MIN_SLEEP, WILL_MAX_SLEEP))
-
-# ---------- Cooldown ----------
-def _cool_ok(state: Dict, channel_id: int) -> bool:
-    cd = state.setdefault("cooldowns", {}).setdefault("Will", {})
-    last = cd.get(channel_id, 0)
-    now = datetime.now().timestamp()
-    if now - last < 120:
-        return False
-    cd[channel_id] = now
-    return True
+        sleep_s = random.randint(WILL_MIN_SLEEP, WILL_MAX_SLEEP)
+        if context is None:
+            # Offline: sleep straight through to the next wake-up
+            sleep_s = max(sleep_s, seconds_until_transition("Will") or 0)
+        post = await sleep_and_fill(
+            "Will",
+            sleep_s,
+            lambda: _chatter_context(state, config),
+            lambda: _chatter_line(
+                priority=PRIORITY_BACKGROUND,
+                channel_id=config["family_group_channel"],
+                call_site="chatter_pool",
+                theme=get_current_theme(state, config),
+            ),
+            will_post=random.random() < scaled(WILL_CHATTER_CHANCE, "chatter"),
+        )
 
 # ---------- Reactive handler ----------
 async def will_handle_message(
@@ -216,24 +279,26 @@ async def will_handle_message(
     channel_id: int,
     discord_author_name: str,
     discord_author_is_bot: bool,
+    reply: Optional[str] = None,
+    features: Optional[MessageFeatures] = None,
 ) -> bool:
     if not is_will_online(state, config):
         return False
-    if not _cool_ok(state, channel_id):
-        return False
 
     addressed = author_label or discord_author_name
     rant = random.random() < RANT_CHANCE
 
-    base_ctx, mem = recall_or_enrich_prompt(
+    # A batched reply was written without recalled context or media, so
+    # none is looked up (or remembered) for it
+    base_ctx, mem = (None, None) if reply else recall_or_enrich_prompt(
         "Will",
         content,
         ["family_chat", "recent", "comfort", "gentle_topics"],
     )
 
     inject = None
-    lower = content.lower()
-    if any(k in lower for k in ["anime", "game", "show", "music", "cosplay", "art", "photo", "coffee"]):
+    features = features or extract_features(content)
+    if not reply and features.media_hook("Will"):
         m = get_media_reference(
             "Will",
             mood_tags=["anime", "jrpg", "indie", "nintendo"],
@@ -251,20 +316,36 @@ async def will_handle_message(
     if inject:
         base += f" If it fits naturally, you can also include: {inject}"
 
-    msg = await _persona_reply(
-        base,
-        timid=(not rant),
-        rant=rant,
-        address_to=addressed,
-    )
-    if not msg:
-        return False
+    priority = PRIORITY_SIBLING if discord_author_is_bot else PRIORITY_HUMAN
+    # A reply prepared by a batched multi-sister request skips generation
+    stream = streaming_enabled(config) and not reply
+    msg = reply
+    if not stream and not msg:
+        msg = await _persona_reply(
+            base,
+            timid=(not rant),
+            rant=rant,
+            address_to=addressed,
+            priority=priority,
+            channel_id=channel_id,
+        )
+        if not msg:
+            return False
 
     for bot in sisters:
         if bot.is_ready() and bot.sister_info["name"] == "Will":
             ch = bot.get_channel(config["family_group_channel"])
             if ch:
-                await send_human_like_message(ch, msg, speaker_name="Will")
+                if stream:
+                    msg = await send_human_like_stream(
+                        ch,
+                        _persona_stream(base, timid=(not rant), rant=rant, address_to=addressed, priority=priority, channel_id=channel_id),
+                        speaker_name="Will",
+                    )
+                    if not msg:
+                        return False
+                elif not await send_human_like_message(ch, msg, speaker_name="Will"):
+                    return False
                 log_event(f"[REPLY] Will → {addressed}: {msg}")
 
                 remember_after_exchange(
@@ -288,5 +369,6 @@ async def will_handle_message(
 # ---------- Startup ----------
 def ensure_will_systems(state: Dict, config: Dict, sisters):
     assign_will_schedule(state, config)
+    warm_persona_prompt("Will", voice=_persona_voice())
     if not state.get("will_chatter_started"):
         asyncio.create_task(will_chatter_loop(state, config, sisters))
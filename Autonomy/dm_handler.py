@@ -1,4 +1,6 @@
 from llm import generate_llm_reply
+from llm_scheduler import PRIORITY_HUMAN
+from conversation_history import record_message
 from .personality import PersonalityManager
 from logger import log_event
 
@@ -9,15 +11,22 @@ async def handle_dm(bot, message, theme_getter):
     name = bot.sister_info["name"]
     pm = PersonalityManager(name)
 
+    record_message(message.channel.id, message.author.display_name, message.content, message_id=message.id)
     try:
         reply = await generate_llm_reply(
             sister=name,
             user_message=message.content,
             theme=theme_getter(),
-            role="dm"
+            role="dm",
+            priority=PRIORITY_HUMAN,
+            channel_id=message.channel.id,
+            call_site="handle_dm",
+            # Recorded above, but it is already the user message
+            trigger_id=message.id,
         )
         if reply:
-            await message.channel.send(reply)
+            sent = await message.channel.send(reply)
+            record_message(message.channel.id, name, reply, message_id=getattr(sent, "id", None))
             log_event(f"[DM] {name} replied in DM to {message.author}: {reply}")
     except Exception as e:
         log_event(f"[DM ERROR] {name}: {e}")
@@ -0,0 +1,145 @@
+# cascade.py
+# Bot-to-bot reply cascade limits.
+#
+# Every family-channel message belongs to a thread rooted at the message
+# that started it: a human or ritual/chatter message is a root (depth 0), and
+# a sibling's reply is one deeper than the message it answers (linked at
+# send time, see messaging_utils). The gateway copy of a reply can arrive
+# before its send returns; position_for() then places it under the parent
+# the caller resolved, and a sibling message with no known parent starts
+# its thread at depth 1 rather than as a fresh depth-0 root. Each thread gets a fixed LLM reply budget
+# from its root, and replies get sharply less likely past `dampen_from`
+# and stop at `max_depth`, so one human message can only ever cost a bounded
+# number of generations.
+
+import time
+import random
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from logger import log_event
+
+CASCADE_MAX_TRACKED = 2048
+CASCADE_TTL_S = 3600.0
+
+MAX_DEPTH = 3
+DAMPEN_FROM = 2
+DAMPING = 0.35
+LLM_BUDGET = 6
+
+
+@dataclass
+class Thread:
+    root_id: int
+    budget: int
+    created: float
+
+
+@dataclass
+class Position:
+    thread: Thread
+    depth: int
+
+
+_positions: "OrderedDict[int, Position]" = OrderedDict()
+_stats = {"threads": 0, "linked_late": 0, "replies": 0, "refunded": 0, "stopped_depth": 0, "damped": 0, "budget_exhausted": 0, "max_depth_seen": 0}
+
+
+def configure_cascade(config: Dict):
+    """Read limits from config "cascade" (max_depth, dampen_from, damping, llm_budget)."""
+    global MAX_DEPTH, DAMPEN_FROM, DAMPING, LLM_BUDGET
+    cfg = config.get("cascade") or {}
+    MAX_DEPTH = int(cfg.get("max_depth", MAX_DEPTH))
+    DAMPEN_FROM = int(cfg.get("dampen_from", DAMPEN_FROM))
+    DAMPING = float(cfg.get("damping", DAMPING))
+    LLM_BUDGET = int(cfg.get("llm_budget", LLM_BUDGET))
+
+
+def _remember(message_id: int, position: Position):
+    _positions[message_id] = position
+    _positions.move_to_end(message_id)
+    now = time.monotonic()
+    while _positions and (
+        len(_positions) > CASCADE_MAX_TRACKED
+        or now - next(iter(_positions.values())).thread.created > CASCADE_TTL_S
+    ):
+        _positions.popitem(last=False)
+
+
+def position_for(message_id: int, parent_id: Optional[int] = None, from_sibling: bool = False) -> Position:
+    """
+    The message's place in its thread. An unknown message goes one below
+    `parent_id` when that is tracked; otherwise it starts a new thread, at
+    depth 1 if a sibling sent it.
+    """
+    position = _positions.get(int(message_id))
+    if position is not None:
+        return position
+    parent = _positions.get(int(parent_id)) if parent_id is not None else None
+    if parent is not None:
+        position = Position(parent.thread, parent.depth + 1)
+        _stats["linked_late"] += 1
+        _stats["max_depth_seen"] = max(_stats["max_depth_seen"], position.depth)
+    else:
+        position = Position(Thread(int(message_id), LLM_BUDGET, time.monotonic()), 1 if from_sibling else 0)
+        _stats["threads"] += 1
+    _remember(int(message_id), position)
+    return position
+
+
+def link_reply(trigger_id: Optional[int], sent_id: Optional[int], terminal: bool = False):
+    """
+    Record that `sent_id` was sent in reply to `trigger_id` (one level
+    deeper). A `terminal` reply is placed at max_depth, so nothing answers it.
+    """
+    if trigger_id is None or sent_id is None:
+        return
+    parent = _positions.get(int(trigger_id))
+    if parent is None:
+        return
+    depth = max(parent.depth + 1, MAX_DEPTH) if terminal else parent.depth + 1
+    _stats["max_depth_seen"] = max(_stats["max_depth_seen"], depth)
+    _remember(int(sent_id), Position(parent.thread, depth))
+
+
+def allow_reply(position: Position) -> bool:
+    """Depth / damping / budget gate for one more reply to this message."""
+    if position.depth >= MAX_DEPTH:
+        _stats["stopped_depth"] += 1
+        return False
+    if position.thread.budget <= 0:
+        _stats["budget_exhausted"] += 1
+        return False
+    if position.depth >= DAMPEN_FROM and random.random() > DAMPING ** (position.depth - DAMPEN_FROM + 1):
+        _stats["damped"] += 1
+        return False
+    return True
+
+
+def allow_reaction(position: Position) -> bool:
+    """Reactions and acks cost no budget, but still stop at max_depth."""
+    return position.depth < MAX_DEPTH
+
+
+def spend(position: Position):
+    """Charge one reply (LLM generation) to the message's thread."""
+    position.thread.budget -= 1
+    _stats["replies"] += 1
+    if position.thread.budget == 0:
+        log_event(f"[CASCADE] Thread {position.thread.root_id} used its reply budget of {LLM_BUDGET}")
+
+
+def refund(position: Position):
+    """Give back a spend() whose reply was never sent (declined, superseded, failed)."""
+    position.thread.budget = min(LLM_BUDGET, position.thread.budget + 1)
+    _stats["replies"] -= 1
+    _stats["refunded"] += 1
+
+
+def get_cascade_stats() -> Dict:
+    return {
+        **_stats,
+        "tracked": len(_positions),
+        "limits": {"max_depth": MAX_DEPTH, "dampen_from": DAMPEN_FROM, "damping": DAMPING, "llm_budget": LLM_BUDGET},
+    }
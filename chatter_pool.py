@@ -0,0 +1,128 @@
+# chatter_pool.py
+# Per-persona pool of pre-generated chatter lines.
+#
+# Chatter loops roll whether their next wake-up posts before they go to
+# sleep. Only when it will, the pool is topped up (on the background LLM
+# lane, with the channel's history) CHATTER_POOL_LEAD_S before the sleep
+# ends, so the line is posted without waiting on a round trip and nothing
+# is generated for a wake-up that stays quiet. Each line is tagged with the
+# context it was written for (theme, mood, schedule day); a line whose
+# context no longer matches, or that is older than CHATTER_POOL_TTL_S, is
+# dropped instead of posted.
+
+import os
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from logger import log_event
+from load_shedder import admit
+from persona_cache import get_cached
+
+CHATTER_POOL_SIZE = int(os.getenv("CHATTER_POOL_SIZE", "1"))
+CHATTER_POOL_TTL_S = float(os.getenv("CHATTER_POOL_TTL_S", str(6 * 3600)))
+CHATTER_POOL_LEAD_S = float(os.getenv("CHATTER_POOL_LEAD_S", "180"))
+
+
+@dataclass
+class PooledLine:
+    text: str
+    mem: Optional[Dict]
+    context: Tuple
+    created: float = field(default_factory=time.monotonic)
+
+
+_pools: Dict[str, Deque[PooledLine]] = {}
+_stats = {"hits": 0, "misses": 0, "generated": 0, "expired": 0, "fill_errors": 0}
+
+
+def _load_mood(memory_path: str) -> str:
+    return get_cached(
+        memory_path,
+        lambda data: str(((data or {}).get("current_mood") or {}).get("type") or ""),
+        namespace="mood",
+    )
+
+
+def chatter_context(theme: str, schedule: Dict, memory_path: str) -> Tuple:
+    """The inputs a chatter line depends on; a change invalidates pooled lines."""
+    return (
+        theme,
+        _load_mood(memory_path),
+        datetime.now().date().isoformat(),
+        schedule.get("wake"),
+        schedule.get("sleep"),
+    )
+
+
+def _prune(persona: str, context: Tuple) -> Deque[PooledLine]:
+    pool = _pools.setdefault(persona, deque())
+    now = time.monotonic()
+    fresh = [
+        line for line in pool
+        if line.context == context and now - line.created < CHATTER_POOL_TTL_S
+    ]
+    _stats["expired"] += len(pool) - len(fresh)
+    pool.clear()
+    pool.extend(fresh)
+    return pool
+
+
+def take_line(persona: str, context: Tuple) -> Optional[PooledLine]:
+    """Pop a pre-generated line still valid for `context`, if any."""
+    pool = _prune(persona, context)
+    if pool:
+        _stats["hits"] += 1
+        return pool.popleft()
+    _stats["misses"] += 1
+    return None
+
+
+def needs_fill(persona: str, context: Tuple) -> bool:
+    return len(_prune(persona, context)) < CHATTER_POOL_SIZE
+
+
+async def sleep_and_fill(
+    persona: str,
+    seconds: float,
+    context_fn: Callable[[], Optional[Tuple]],
+    generate: Callable[[], Awaitable[Tuple[Optional[str], Any]]],
+    will_post: bool = True,
+) -> bool:
+    """
+    Sleep for `seconds`. If the wake-up will post (`will_post`), top up
+    `persona`'s pool CHATTER_POOL_LEAD_S before the end. `context_fn` returns
+    None while the persona is offline (nothing is generated then);
+    `generate` returns (text, mem). Returns whether to still post: False if
+    the post was shed because the pipeline got busy.
+    """
+    started = time.monotonic()
+    await asyncio.sleep(max(0.0, seconds - CHATTER_POOL_LEAD_S))
+    try:
+        context = context_fn() if will_post else None
+        # Chatter is the first thing to go when the pipeline is busy
+        if context is not None and needs_fill(persona, context) and not admit("chatter"):
+            will_post, context = False, None
+        while context is not None and needs_fill(persona, context):
+            text, mem = await generate()
+            if not text:
+                break
+            _pools[persona].append(PooledLine(text=text, mem=mem, context=context))
+            _stats["generated"] += 1
+    except Exception as e:
+        _stats["fill_errors"] += 1
+        log_event(f"[WARN] Chatter pre-generation failed for {persona}: {e}")
+    await asyncio.sleep(max(0.0, seconds - (time.monotonic() - started)))
+    return will_post
+
+
+def get_chatter_pool_stats() -> Dict:
+    served = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_rate": round(_stats["hits"] / served, 3) if served else None,
+        "pooled": {name: len(pool) for name, pool in _pools.items()},
+    }
@@ -0,0 +1,232 @@
+# conversation_history.py
+# Bounded per-channel history of recent messages, fed to the LLM.
+#
+# - Each channel keeps at most `lookback` messages (config.conversation.lookback),
+#   at most MAX_CHARS_PER_CHANNEL characters of text and at most
+#   `history_token_budget` prompt tokens, so the whole window fits a prompt.
+# - Incoming messages are recorded by main.on_family_message, outgoing ones by
+#   messaging_utils as they are sent; message IDs stop the gateway echo of our
+#   own sends from being stored twice.
+# - history_for_prompt() returns the window (minus the message being answered).
+# - Turns evicted from the window queue up for history_compactor, which folds
+#   them into a running per-channel summary persisted to SUMMARY_FILE; a turn
+#   is either in the prompt or on its way into the summary, never just lost.
+#   When a channel falls out of the MAX_CHANNELS LRU its whole window joins
+#   the queue and is folded on the compactor's next pass. Past
+#   MAX_PENDING_TURNS (compactor failing for a while) the oldest pending
+#   turns are dropped and counted in get_history_stats()["pending_dropped"].
+
+import os
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from logger import log_event
+
+from prompt_compiler import count_tokens
+
+LOOKBACK = 20
+MAX_CHARS_PER_CHANNEL = 6000
+MAX_MESSAGE_CHARS = 500
+MAX_CHANNELS = 64
+HISTORY_TOKEN_BUDGET = 600
+MAX_PENDING_TURNS = 80
+SUMMARY_FILE = os.environ.get("SUMMARY_FILE", "/app/data/conversation_summaries.json")
+
+# channel_id -> deque of (message_id, author, content, tokens)
+_channels: "OrderedDict[int, Deque[Tuple[Optional[int], str, str, int]]]" = OrderedDict()
+_chars: Dict[int, int] = {}
+_tokens: Dict[int, int] = {}
+# channel_id -> (author, content) turns evicted but not yet summarized
+_evicted: Dict[int, Deque[Tuple[str, str]]] = {}
+# channels whose pending queue overflowed since it was last taken (logged once)
+_overflowed: set = set()
+_dropped_turns = 0
+# str(channel_id) -> {"summary", "turns", "updated"}
+_summaries: Dict[str, Dict] = {}
+
+
+def configure_history(config: Dict):
+    """Apply conversation.lookback / conversation.history_token_budget."""
+    global LOOKBACK, HISTORY_TOKEN_BUDGET
+    conv = config.get("conversation") or {}
+    LOOKBACK = max(1, int(conv.get("lookback", LOOKBACK)))
+    HISTORY_TOKEN_BUDGET = max(0, int(conv.get("history_token_budget", HISTORY_TOKEN_BUDGET)))
+
+
+def _channel(channel_id: int) -> Deque[Tuple[Optional[int], str, str, int]]:
+    buf = _channels.get(channel_id)
+    if buf is None:
+        buf = deque()
+        _channels[channel_id] = buf
+        _chars[channel_id] = 0
+        _tokens[channel_id] = 0
+        while len(_channels) > MAX_CHANNELS:
+            old_id, old_buf = _channels.popitem(last=False)
+            _chars.pop(old_id, None)
+            _tokens.pop(old_id, None)
+            _queue_evicted(old_id, [(author, content) for _, author, content, _ in old_buf])
+    else:
+        _channels.move_to_end(channel_id)
+    return buf
+
+
+def record_message(
+    channel_id: int,
+    author: str,
+    content: str,
+    message_id: Optional[int] = None,
+) -> bool:
+    """Append one message; returns False if it was empty or already stored."""
+    content = (content or "").strip()
+    if not content:
+        return False
+    channel_id = int(channel_id)
+    buf = _channel(channel_id)
+    if message_id is not None and any(mid == message_id for mid, _, _, _ in buf):
+        return False
+
+    content = content[:MAX_MESSAGE_CHARS]
+    tokens = count_tokens(f"{author}: {content}") + 1
+    buf.append((message_id, author, content, tokens))
+    _chars[channel_id] += len(content)
+    _tokens[channel_id] += tokens
+    while buf and (
+        len(buf) > LOOKBACK
+        or _chars[channel_id] > MAX_CHARS_PER_CHANNEL
+        or _tokens[channel_id] > HISTORY_TOKEN_BUDGET
+    ):
+        _, author_out, dropped, dropped_tokens = buf.popleft()
+        _chars[channel_id] -= len(dropped)
+        _tokens[channel_id] -= dropped_tokens
+        _queue_evicted(channel_id, [(author_out, dropped)])
+    return True
+
+
+def _queue_evicted(channel_id: int, turns: List[Tuple[str, str]], front: bool = False):
+    """Add turns to the channel's summary queue, counting any that overflow it."""
+    global _dropped_turns
+    if not turns:
+        return
+    pending = _evicted.get(channel_id)
+    if pending is None:
+        pending = _evicted[channel_id] = deque(maxlen=MAX_PENDING_TURNS)
+    overflow = max(0, len(pending) + len(turns) - MAX_PENDING_TURNS)
+    if front:
+        # requeue: keep the newest turns, so the failed batch loses its oldest
+        queued = (list(turns) + list(pending))[overflow:]
+        pending.clear()
+        pending.extend(queued)
+    else:
+        pending.extend(turns)
+    if overflow:
+        _dropped_turns += overflow
+        if channel_id not in _overflowed:
+            _overflowed.add(channel_id)
+            log_event(
+                f"[WARN] Summary queue for channel {channel_id} is full "
+                f"({MAX_PENDING_TURNS} turns); dropping the oldest unsummarized turns"
+            )
+
+
+def get_history(channel_id: int) -> List[Tuple[str, str]]:
+    """All retained (author, content) pairs for a channel, oldest first."""
+    buf = _channels.get(int(channel_id))
+    return [(author, content) for _, author, content, _ in buf] if buf else []
+
+
+def history_for_prompt(channel_id: int, exclude_id: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    The channel's window, oldest first, minus message `exclude_id`. The
+    window is already held to the token budget (older turns are evicted
+    into the summary queue), so nothing in it is dropped here.
+    """
+    buf = _channels.get(int(channel_id))
+    if not buf:
+        return []
+    return [
+        (author, content)
+        for message_id, author, content, _ in buf
+        if exclude_id is None or message_id != exclude_id
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Rolling summaries of turns that fell out of the window
+# ---------------------------------------------------------------------------
+def pending_turns(channel_id: int) -> int:
+    return len(_evicted.get(int(channel_id), ()))
+
+
+def channels_with_pending(min_turns: int) -> List[int]:
+    """Channels with `min_turns` queued, plus any no longer in the window LRU."""
+    return [
+        cid for cid, turns in _evicted.items()
+        if turns and (len(turns) >= min_turns or cid not in _channels)
+    ]
+
+
+def take_evicted(channel_id: int) -> List[Tuple[str, str]]:
+    """Remove and return the channel's unsummarized evicted turns."""
+    channel_id = int(channel_id)
+    _overflowed.discard(channel_id)
+    turns = _evicted.pop(channel_id, None)
+    return list(turns) if turns else []
+
+
+def requeue_evicted(channel_id: int, turns: List[Tuple[str, str]]):
+    """Put turns back in front of the queue after a failed summary call."""
+    _queue_evicted(int(channel_id), list(turns), front=True)
+
+
+def get_summary(channel_id: int) -> Optional[str]:
+    entry = _summaries.get(str(channel_id))
+    return entry["summary"] if entry else None
+
+
+def set_summary(channel_id: int, summary: str, turns_folded: int):
+    entry = _summaries.setdefault(str(channel_id), {"summary": "", "turns": 0, "updated": None})
+    entry["summary"] = summary
+    entry["turns"] += turns_folded
+    entry["updated"] = time.time()
+    _save_summaries()
+
+
+def load_summaries():
+    global _summaries
+    try:
+        if os.path.exists(SUMMARY_FILE):
+            with open(SUMMARY_FILE, "r", encoding="utf-8") as f:
+                _summaries = json.load(f)
+    except Exception as e:
+        log_event(f"[WARN] Failed to load conversation summaries: {e}")
+        _summaries = {}
+
+
+def _save_summaries():
+    try:
+        os.makedirs(os.path.dirname(SUMMARY_FILE) or ".", exist_ok=True)
+        tmp = SUMMARY_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_summaries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, SUMMARY_FILE)
+    except Exception as e:
+        log_event(f"[WARN] Failed to save conversation summaries: {e}")
+
+
+def get_history_stats() -> Dict:
+    return {
+        "channels": len(_channels),
+        "messages": sum(len(b) for b in _channels.values()),
+        "chars": sum(_chars.values()),
+        "tokens": sum(_tokens.values()),
+        "lookback": LOOKBACK,
+        "token_budget": HISTORY_TOKEN_BUDGET,
+        "pending_turns": sum(len(t) for t in _evicted.values()),
+        "pending_dropped": _dropped_turns,
+        "summaries": {
+            cid: {"turns": e["turns"], "tokens": count_tokens(e["summary"])}
+            for cid, e in _summaries.items()
+        },
+    }
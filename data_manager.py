@@ -1,6 +1,8 @@
 import os
 from datetime import datetime
 
+from message_features import extract_features
+
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -63,22 +65,13 @@ def log_denial(user, event, notes="", spontaneous=False):
 def read_denial(limit=10): return _read_lines("denial_tracker.txt", limit)
 
 # ---- Parser ----
-def _has_any(msg, words): return any(w in msg for w in words)
-def _detect_category(msg):
-    if _has_any(msg, ["plug","buttplug"]): return "plug"
-    if _has_any(msg, ["chastity","cage"]): return "chastity"
-    if _has_any(msg, ["anal","dilate"]): return "anal"
-    if _has_any(msg, ["oral","mouth"]): return "oral"
-    if _has_any(msg, ["training","exercise"]): return "training"
-    if _has_any(msg, ["denial","edge","ruin"]): return "denial"
-    return None
-
-def parse_data_command(user, message):
-    msg = message.lower()
-    spontaneous = "[spontaneous]" in msg
-
-    if _has_any(msg, ["show","get","list","history"]):
-        cat = _detect_category(msg)
+# Keyword tables live in message_features (DATA_*_KEYWORDS)
+def parse_data_command(user, message, features=None):
+    features = features or extract_features(message)
+    spontaneous = "[spontaneous]" in features.lowered
+
+    if features.has_any("data_read"):
+        cat = features.data_category
         if cat == "plug": return True, "\n".join(read_plug()), None
         if cat == "chastity": return True, "\n".join(read_chastity()), None
         if cat == "anal": return True, "\n".join(read_anal()), None
@@ -87,8 +80,8 @@ def parse_data_command(user, message):
         if cat == "denial": return True, "\n".join(read_denial()), None
         return False, "", None
 
-    if _has_any(msg, ["log","record","note"]) or spontaneous:
-        cat = _detect_category(msg)
+    if features.has_any("data_log") or spontaneous:
+        cat = features.data_category
         if cat == "plug":
             log_plug(user, "session", message, spontaneous)
             return True, "🍑 Plug log updated.", read_plug(1)[-1]
@@ -0,0 +1,107 @@
+# event_bus.py
+# Bounded queue + worker tasks between gateway receipt and message routing,
+# so slow persona handling never holds up discord.py's event dispatch.
+#
+# - publish_event() never blocks: when the queue is full the oldest queued
+#   event (the stalest) is dropped to make room.
+# - Workers skip events that waited longer than EVENT_MAX_AGE_S; a reply to
+#   a message that old would arrive out of context anyway.
+# - Queue depth, drops and publish -> handling lag are exposed as stats.
+
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from logger import log_event
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "200"))
+EVENT_WORKERS = int(os.getenv("EVENT_WORKERS", "4"))
+EVENT_MAX_AGE_S = float(os.getenv("EVENT_MAX_AGE_S", "60"))
+
+_queue: Optional["asyncio.Queue[Tuple[float, Any]]"] = None
+_workers: List[asyncio.Task] = []
+_lag: Deque[float] = deque(maxlen=500)
+_stats = {
+    "published": 0,
+    "handled": 0,
+    "errors": 0,
+    "dropped_full": 0,
+    "dropped_stale": 0,
+    "max_depth": 0,
+}
+
+
+async def _worker(handler: Callable[[Any], Awaitable[None]]):
+    while True:
+        enqueued, event = await _queue.get()
+        try:
+            lag = time.monotonic() - enqueued
+            if lag > EVENT_MAX_AGE_S:
+                _stats["dropped_stale"] += 1
+                continue
+            _lag.append(lag)
+            await handler(event)
+            _stats["handled"] += 1
+        except Exception as e:
+            _stats["errors"] += 1
+            log_event(f"[ERROR] Event handler failed: {e}")
+        finally:
+            _queue.task_done()
+
+
+def start_event_bus(handler: Callable[[Any], Awaitable[None]], workers: int = EVENT_WORKERS):
+    """Create the queue and start `workers` tasks feeding events to `handler`."""
+    global _queue
+    if _queue is not None:
+        return
+    _queue = asyncio.Queue(maxsize=max(1, EVENT_QUEUE_SIZE))
+    for _ in range(max(1, workers)):
+        _workers.append(asyncio.create_task(_worker(handler)))
+    log_event(f"[EVENTS] Bus started: {len(_workers)} workers, queue {EVENT_QUEUE_SIZE}")
+
+
+def publish_event(event: Any) -> bool:
+    """Queue `event` for the workers; False if the bus isn't running."""
+    if _queue is None:
+        return False
+    if _queue.full():
+        _queue.get_nowait()
+        _queue.task_done()
+        _stats["dropped_full"] += 1
+    _queue.put_nowait((time.monotonic(), event))
+    _stats["published"] += 1
+    _stats["max_depth"] = max(_stats["max_depth"], _queue.qsize())
+    return True
+
+
+async def wait_idle():
+    """Wait until every queued event has been handled (or dropped)."""
+    if _queue is not None:
+        await _queue.join()
+
+
+async def stop_event_bus():
+    global _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+
+
+def get_event_bus_stats() -> Dict:
+    ordered = sorted(_lag)
+
+    def _ms(q):
+        return round(1000 * ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1) if ordered else None
+
+    return {
+        **_stats,
+        "depth": _queue.qsize() if _queue is not None else 0,
+        "workers": len(_workers),
+        "lag_p50_ms": _ms(0.5),
+        "lag_p90_ms": _ms(0.9),
+        "lag_max_ms": round(1000 * ordered[-1], 1) if ordered else None,
+    }
@@ -0,0 +1,129 @@
+# fake_llm.py
+# Deterministic stand-in for an OpenAI-compatible chat endpoint, used by the
+# "fake" backend type in llm_backends (see replay_bench.py).
+#
+# The same request always produces the same text and the same simulated
+# latency, so benchmark runs are comparable. The latency is drawn from a
+# configurable distribution, e.g.
+#   {"dist": "lognormal", "median_ms": 450, "sigma": 0.4,
+#    "first_token_ms": 250, "per_token_ms": 15, "error_rate": 0.0}
+# dist is fixed | uniform (min_ms, max_ms) | normal (median_ms, sigma_ms) |
+# lognormal (median_ms, sigma).
+
+import re
+import json
+import math
+import random
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import httpx
+import openai
+
+_WORDS = (
+    "honestly today felt slow but good and I finally got the kitchen sorted "
+    "we should plan something small this weekend maybe tea and a walk "
+    "you always say that and then disappear into a game for six hours "
+    "proud of everyone for sticking to the routine even when it rained"
+).split()
+
+_JSON_KEYS = re.compile(r"keys are exactly: ([^\n]+?)\. ")
+
+
+def _rng(model: str, messages: List[Dict], seed: int) -> random.Random:
+    raw = json.dumps([model, seed, [m.get("content", "") for m in messages]], sort_keys=True)
+    return random.Random(int(hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16], 16))
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.sample(_WORDS, rng.randint(5, 12))
+    return " ".join(words).capitalize() + rng.choice([".", "!", "?", "..."])
+
+
+def _latency_s(rng: random.Random, cfg: Dict) -> float:
+    dist = cfg.get("dist", "lognormal")
+    median = float(cfg.get("median_ms", 450))
+    if dist == "fixed":
+        ms = median
+    elif dist == "uniform":
+        ms = rng.uniform(float(cfg.get("min_ms", 100)), float(cfg.get("max_ms", 800)))
+    elif dist == "normal":
+        ms = rng.gauss(median, float(cfg.get("sigma_ms", median / 4)))
+    else:
+        ms = median * math.exp(rng.gauss(0.0, float(cfg.get("sigma", 0.4))))
+    return max(0.0, ms) / 1000
+
+
+def _usage(messages: List[Dict], text: str) -> SimpleNamespace:
+    prompt_chars = sum(len(m.get("content", "")) for m in messages)
+    return SimpleNamespace(
+        prompt_tokens=prompt_chars // 4,
+        completion_tokens=max(1, len(text) // 4),
+        prompt_tokens_details=None,
+    )
+
+
+class _FakeStream:
+    def __init__(self, text: str, usage, per_token_s: float):
+        self._pieces = [w + " " for w in text.split()]
+        self._usage = usage
+        self._per_token_s = per_token_s
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for piece in self._pieces:
+            await asyncio.sleep(self._per_token_s)
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))],
+                usage=None,
+            )
+        yield SimpleNamespace(choices=[], usage=self._usage)
+
+
+class _FakeCompletions:
+    def __init__(self, client: "FakeAsyncClient"):
+        self._client = client
+
+    async def create(self, *, model: str, messages: List[Dict], stream: bool = False, **params):
+        cfg = self._client.latency
+        rng = _rng(model, messages, self._client.seed)
+        self._client.calls += 1
+
+        if rng.random() < float(cfg.get("error_rate", 0.0)):
+            await asyncio.sleep(_latency_s(rng, cfg))
+            raise openai.APIConnectionError(request=httpx.Request("POST", "http://fake-llm/v1/chat/completions"))
+
+        text = " ".join(_sentence(rng) for _ in range(rng.randint(1, 3)))
+        if (params.get("response_format") or {}).get("type") == "json_object":
+            system = messages[0].get("content", "") if messages else ""
+            m = _JSON_KEYS.search(system)
+            names = [n.strip() for n in m.group(1).split(",")] if m else []
+            text = json.dumps({name: _sentence(rng) for name in names})
+
+        usage = _usage(messages, text)
+        if stream:
+            await asyncio.sleep(float(cfg.get("first_token_ms", 250)) / 1000)
+            return _FakeStream(text, usage, float(cfg.get("per_token_ms", 15)) / 1000)
+
+        await asyncio.sleep(_latency_s(rng, cfg))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=usage,
+        )
+
+
+class FakeAsyncClient:
+    """Duck-types the parts of openai.AsyncOpenAI that llm.py uses."""
+
+    def __init__(self, latency: Optional[Dict] = None, seed: int = 0):
+        self.latency = dict(latency or {})
+        self.seed = seed
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    async def close(self):
+        return None
@@ -0,0 +1,60 @@
+# history_compactor.py
+# Background task that folds turns evicted from the per-channel history
+# window into a running summary (see conversation_history), one cheap LLM
+# call per COMPACT_EVERY turns, so prompt size stays flat on busy days.
+
+import os
+import asyncio
+from typing import Dict
+
+from logger import log_event
+from llm import summarize_conversation
+from conversation_history import (
+    channels_with_pending,
+    take_evicted,
+    requeue_evicted,
+    get_summary,
+    set_summary,
+)
+
+COMPACT_EVERY = 10
+COMPACT_POLL_S = float(os.getenv("HISTORY_COMPACT_POLL_S", "60"))
+
+_stats = {"runs": 0, "turns_folded": 0, "failures": 0}
+
+
+def configure_compactor(config: Dict):
+    """Apply conversation.compact_every."""
+    global COMPACT_EVERY
+    conv = config.get("conversation") or {}
+    COMPACT_EVERY = max(1, int(conv.get("compact_every", COMPACT_EVERY)))
+
+
+async def compact_channel(channel_id: int) -> bool:
+    turns = take_evicted(channel_id)
+    if not turns:
+        return False
+    summary = await summarize_conversation(get_summary(channel_id), turns)
+    if not summary:
+        requeue_evicted(channel_id, turns)
+        _stats["failures"] += 1
+        return False
+    set_summary(channel_id, summary, len(turns))
+    _stats["runs"] += 1
+    _stats["turns_folded"] += len(turns)
+    log_event(f"[HISTORY] Folded {len(turns)} turns into summary for channel {channel_id}")
+    return True
+
+
+async def history_compactor_loop():
+    while True:
+        for channel_id in channels_with_pending(COMPACT_EVERY):
+            try:
+                await compact_channel(channel_id)
+            except Exception as e:
+                log_event(f"[ERROR] History compaction failed for {channel_id}: {e}")
+        await asyncio.sleep(COMPACT_POLL_S)
+
+
+def get_compactor_stats() -> Dict:
+    return {**_stats, "compact_every": COMPACT_EVERY}
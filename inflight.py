@@ -0,0 +1,103 @@
+# inflight.py
+# Tracks the reply each persona is working on per channel, so a newer
+# message that triggers the same persona supersedes the older one.
+#
+# A superseded reply that is still generating is cancelled outright. One
+# that has already started sending is allowed to finish (a half-sent
+# message looks worse than a stale one). The send functions in
+# messaging_utils call claim_send() first, which also catches a reply
+# superseded between generation and sending.
+
+import asyncio
+import contextvars
+from typing import Awaitable, Dict, Optional, Tuple, TypeVar
+
+from logger import log_event
+
+T = TypeVar("T")
+
+
+class Generation:
+    def __init__(self, key: Tuple[str, int], message_id: Optional[int]):
+        self.key = key
+        self.message_id = message_id
+        self.task: Optional[asyncio.Task] = None
+        self.superseded = False
+        self.sending = False
+
+    def supersede(self):
+        self.superseded = True
+        _stats["superseded"] += 1
+        if not self.sending and self.task is not None and not self.task.done():
+            self.task.cancel()
+            _stats["cancelled"] += 1
+
+
+_current_generation: contextvars.ContextVar[Optional[Generation]] = contextvars.ContextVar(
+    "current_generation", default=None
+)
+_in_flight: Dict[Tuple[str, int], Generation] = {}
+_stats = {"started": 0, "superseded": 0, "cancelled": 0, "dropped_before_send": 0}
+
+
+async def run_latest(persona: str, channel_id: int, message_id: Optional[int], coro: Awaitable[T]) -> Optional[T]:
+    """
+    Run `coro` as `persona`'s current reply in `channel_id`, superseding any
+    reply it is still working on there. Returns None if this reply is itself
+    superseded before it starts sending.
+    """
+    key = (persona, int(channel_id))
+    previous = _in_flight.get(key)
+    if previous is not None:
+        log_event(f"[INFLIGHT] {persona} reply to {previous.message_id} superseded by {message_id}")
+        previous.supersede()
+
+    gen = Generation(key, message_id)
+
+    async def _runner():
+        _current_generation.set(gen)
+        return await coro
+
+    gen.task = asyncio.ensure_future(_runner())
+    _in_flight[key] = gen
+    _stats["started"] += 1
+    try:
+        return await gen.task
+    except asyncio.CancelledError:
+        if gen.superseded and gen.task.cancelled():
+            return None
+        raise
+    finally:
+        if _in_flight.get(key) is gen:
+            del _in_flight[key]
+
+
+def claim_send() -> bool:
+    """
+    Called right before a reply is sent. False means the reply was
+    superseded and must be dropped; otherwise it can no longer be cancelled.
+    """
+    gen = _current_generation.get()
+    if gen is None:
+        return True
+    if gen.superseded:
+        _stats["dropped_before_send"] += 1
+        return False
+    gen.sending = True
+    return True
+
+
+def in_flight_message_id(persona: str, channel_id: int) -> Optional[int]:
+    """ID of the message `persona`'s running reply in `channel_id` answers, if any."""
+    gen = _in_flight.get((persona, int(channel_id)))
+    return gen.message_id if gen is not None else None
+
+
+def current_message_id() -> Optional[int]:
+    """ID of the message the running reply answers, if inside run_latest()."""
+    gen = _current_generation.get()
+    return gen.message_id if gen is not None else None
+
+
+def get_inflight_stats() -> Dict:
+    return {**_stats, "in_flight": len(_in_flight)}
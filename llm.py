@@ -1,27 +1,100 @@
 import os
 import json
+import time
+import random
 import openai
 import asyncio
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+
+from llm_scheduler import scheduler, PRIORITY_SIBLING, PRIORITY_BACKGROUND
+from persona_cache import get_cached
+from llm_resilience import CircuitOpenError
+from llm_backends import (
+    LLM_MODEL,
+    LLM_TIMEOUT_S,
+    Backend,
+    call_routed,
+    call_type_for,
+    close_backends,
+)
+from conversation_history import history_for_prompt, get_summary
+from inflight import current_message_id
+from response_cache import response_cache, make_key
+from usage_ledger import record_usage, record_response_usage
+from prompt_compiler import (
+    CompiledPrompt,
+    compile_persona_prefix,
+    build_suffix,
+    assemble_messages,
+)
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 MEMORY_DIR = "data/memory"
+PERSONALITY_DIR = "Autonomy/Personalities"
+
+# ---------------------------------------------------------------------------
+# Clients live in llm_backends (one pooled AsyncOpenAI per backend)
+# ---------------------------------------------------------------------------
+LLM_USE_ASYNC_CLIENT = os.getenv("LLM_USE_ASYNC_CLIENT", "1") != "0"
+# Opt-in A/B baseline: fraction of calls to the default OpenAI backend sent
+# through the old blocking executor path, for comparing the async client in
+# the latency report. Off in production (0).
+LLM_EXECUTOR_SAMPLE_RATE = float(os.getenv("LLM_EXECUTOR_SAMPLE_RATE", "0"))
+
+_latency: Dict[str, deque] = {
+    "async": deque(maxlen=200),
+    "executor": deque(maxlen=200),
+    "stream_first_token": deque(maxlen=200),
+}
+
+async def close_llm_client():
+    """Close every backend's pooled HTTP session (call on shutdown)."""
+    await close_backends()
+
+def _record_latency(path: str, started: float):
+    _latency[path].append(time.perf_counter() - started)
+
+def get_llm_latency_stats() -> Dict:
+    """
+    Average / p50 latency per call path, plus the estimated time saved per
+    call by the async client compared with the executor path.
+    """
+    out: Dict = {}
+    for path, samples in _latency.items():
+        if samples:
+            ordered = sorted(samples)
+            out[path] = {
+                "calls": len(samples),
+                "avg_ms": round(1000 * sum(samples) / len(samples), 1),
+                "p50_ms": round(1000 * ordered[len(ordered) // 2], 1),
+            }
+        else:
+            out[path] = {"calls": 0, "avg_ms": None, "p50_ms": None}
+    a, e = out["async"]["avg_ms"], out["executor"]["avg_ms"]
+    out["saved_ms_per_call"] = round(e - a, 1) if a is not None and e is not None else None
+    return out
+
+def _summarize_personality(name: str, data: Optional[dict]) -> str:
+    if data is None:
+        return f"{name} has undefined personality."
+    core = data.get("core_personality", "")
+    essence = data.get("essence", "")
+    traits = data.get("growth_path", {})
+    sorted_traits = sorted(traits.items(), key=lambda x: -x[1])[:3]
+    traits_summary = ", ".join([f"{t}={v:.2f}" for t, v in sorted_traits])
+    examples = data.get("speech_examples", [])
+    example_summary = " | ".join(examples[:3]) if examples else ""
+    return f"{essence}\nTraits: {traits_summary}\nStyle examples: {example_summary}\n({core})"
 
 def load_personality_summary(name: str):
-    """Load a sister's personality summary from memory JSON."""
+    """Load a sister's personality summary from memory JSON (cached, mtime-validated)."""
     path = os.path.join(MEMORY_DIR, f"{name}.json")
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        core = data.get("core_personality", "")
-        essence = data.get("essence", "")
-        traits = data.get("growth_path", {})
-        sorted_traits = sorted(traits.items(), key=lambda x: -x[1])[:3]
-        traits_summary = ", ".join([f"{t}={v:.2f}" for t, v in sorted_traits])
-        examples = data.get("speech_examples", [])
-        example_summary = " | ".join(examples[:3]) if examples else ""
-        return f"{essence}\nTraits: {traits_summary}\nStyle examples: {example_summary}\n({core})"
-    except FileNotFoundError:
-        return f"{name} has undefined personality."
+    return get_cached(
+        path,
+        lambda data: _summarize_personality(name, data),
+        namespace="personality_summary",
+    )
 
 def inject_personality_bias(name: str) -> str:
     """Add special bias instructions per sister for stronger differentiation."""
@@ -35,61 +108,388 @@ def inject_personality_bias(name: str) -> str:
         return "Lean bookish and introverted: thoughtful, quiet, with clarity and reserved warmth."
     return ""
 
-async def generate_llm_reply(sister, user_message, theme, role, history=None):
-    """Generate a reply for one of the sisters with personality + history context."""
-    personality_summary = load_personality_summary(sister)
-    personality_bias = inject_personality_bias(sister)
+def _completion_params(messages, **overrides) -> Dict:
+    params = dict(
+        model=LLM_MODEL,
+        messages=messages,
+        max_tokens=160,
+        temperature=0.9,
+        presence_penalty=0.7,
+        frequency_penalty=0.6,
+    )
+    params.update(overrides)
+    return params
+
+async def _complete(
+    backend: Backend,
+    messages,
+    timeout: Optional[float] = None,
+    persona: str = "unknown",
+    call_site: str = "unknown",
+    **overrides,
+) -> str:
+    """
+    Run one chat completion on `backend`. Uses its pooled async client;
+    only with LLM_EXECUTOR_SAMPLE_RATE set (or LLM_USE_ASYNC_CLIENT=0) do
+    default-OpenAI calls go through the legacy executor path. Token usage is recorded in usage_ledger under
+    (persona, call_site); async-client latency feeds the backend's routing
+    percentiles (executor samples would skew them with the slow path).
+    """
+    params = _completion_params(messages, model=backend.model, **overrides)
+    timeout = timeout or backend.timeout_s
+    started = time.perf_counter()
+    try:
+        use_executor = backend.kind == "openai" and backend.base_url is None and (
+            not LLM_USE_ASYNC_CLIENT or random.random() < LLM_EXECUTOR_SAMPLE_RATE
+        )
+        if not use_executor:
+            response = await backend.client().chat.completions.create(**params, timeout=timeout)
+            _record_latency("async", started)
+        else:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                None,
+                lambda: openai.chat.completions.create(**params, timeout=timeout),
+            )
+            _record_latency("executor", started)
+    except Exception:
+        record_usage(persona, call_site, params["model"], latency_s=time.perf_counter() - started, ok=False)
+        raise
+    elapsed = time.perf_counter() - started
+    if not use_executor:
+        backend.record_latency(elapsed)
+    record_response_usage(persona, call_site, params["model"], response.usage, elapsed)
+    return response.choices[0].message.content.strip()
+
+def _is_retryable(e: Exception) -> bool:
+    """
+    Timeouts, connection errors, 408/409/429 and 5xx are worth retrying.
+    Anything else (bad requests, programming errors) fails at once and does
+    not count against the backend's circuit breaker.
+    """
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code in (408, 409, 429) or e.status_code >= 500
+    return False
+
+def fallback_reply(sister) -> Optional[str]:
+    """Zero-latency canned line from the sister's speech_examples."""
+    path = os.path.join(PERSONALITY_DIR, f"{sister}_Personality.json")
+    examples = get_cached(
+        path,
+        lambda data: list((data or {}).get("speech_examples") or []),
+        namespace="speech_examples",
+    )
+    return random.choice(examples) if examples else None
+
+# Each sister's voice text as last compiled, reused by batched replies
+_voices: Dict[str, str] = {}
+
+def _compiled_prefix(sister, voice=None) -> CompiledPrompt:
+    if voice:
+        _voices[sister] = voice
+    return compile_persona_prefix(
+        sister,
+        load_personality_summary(sister),
+        inject_personality_bias(sister),
+        voice,
+    )
+
+def warm_persona_prompt(sister, voice=None) -> CompiledPrompt:
+    """Compile a sister's static prompt prefix ahead of the first reply."""
+    return _compiled_prefix(sister, voice)
+
+def _channel_context(history, channel_id, trigger_id=None):
+    """
+    (history, summary) for a call. Explicit history wins; otherwise the
+    channel's budgeted history is used, plus its rolling summary. The message
+    being replied to (`trigger_id`, or the running reply's, see inflight) is
+    left out: the instruction already quotes it.
+    """
+    if channel_id is None:
+        return history, None
+    if history is None:
+        history = history_for_prompt(channel_id, exclude_id=trigger_id or current_message_id())
+    return history, get_summary(channel_id)
+
+def _build_messages(sister, user_message, theme, role, history=None, voice=None, summary=None) -> List[Dict]:
+    """
+    Build the messages for one sister's reply: the compiled static prefix
+    (identical across calls), then theme/role/summary/history, then the
+    instruction.
+    """
+    return assemble_messages(
+        _compiled_prefix(sister, voice),
+        build_suffix(theme, role, history, summary),
+        user_message,
+    )
 
-    # format conversation history
+async def generate_llm_reply(
+    sister, user_message, theme, role, history=None, timeout=None, priority=PRIORITY_SIBLING,
+    voice=None, channel_id=None, cache_prompt=None, call_site="unknown", trigger_id=None,
+):
+    """
+    Generate a reply for one of the sisters with personality + history context.
+    `priority` picks the scheduler lane (see llm_scheduler); `voice` is the
+    behavior's static style text, compiled into the cacheable prefix. When
+    `history` is None and `channel_id` is given, the channel's recent
+    messages from conversation_history are used, minus the message being
+    answered (`trigger_id`, default: the running reply's, see inflight).
+
+    `call_site` tags the call's token usage in usage_ledger.
+
+    Passing `cache_prompt` (a stable prompt such as a chatter base prompt)
+    opts into response_cache: once a few completions exist for
+    (sister, theme, cache_prompt), one of them is returned without a call.
+
+    The call goes to the fastest healthy backend for its call type (see
+    llm_backends). Failed calls are retried with backoff and then fail over
+    to the next backend; while every backend's circuit is open a canned line
+    from the sister's speech_examples is returned instead.
+    """
+    cache_key = None
+    if cache_prompt is not None:
+        cache_key = make_key(sister, theme, cache_prompt)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    history, summary = _channel_context(history, channel_id, trigger_id)
+    messages = _build_messages(sister, user_message, theme, role, history, voice, summary)
+
+    async def _attempt(backend: Backend):
+        async with scheduler.slot(priority):
+            return await _complete(backend, messages, timeout=timeout, persona=sister, call_site=call_site)
+
+    started = time.perf_counter()
+    try:
+        reply = await call_routed(call_type_for(call_site), _attempt, retryable=_is_retryable)
+        if cache_key is not None and reply:
+            response_cache.put(cache_key, reply, time.perf_counter() - started)
+        return reply
+    except CircuitOpenError:
+        return fallback_reply(sister)
+    except Exception as e:
+        print(f"[LLM ERROR] {sister}: {e}")
+        return None
+
+async def stream_llm_reply(
+    sister, user_message, theme, role, history=None, timeout=None, priority=PRIORITY_SIBLING,
+    voice=None, channel_id=None, call_site="unknown",
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of generate_llm_reply: yields text deltas as they
+    arrive so the sender can post the first sentence before the rest is done.
+    Opening the stream is retried like a normal call; while the circuit is
+    open the canned fallback line is yielded. Yields nothing on failure.
+    """
+    started = time.perf_counter()
+    history, summary = _channel_context(history, channel_id)
+    messages = _build_messages(sister, user_message, theme, role, history, voice, summary)
+
+    async def _open(backend: Backend):
+        await scheduler.acquire(priority)
+        opening = time.perf_counter()
+        try:
+            stream = await backend.client().chat.completions.create(
+                **_completion_params(messages, model=backend.model),
+                stream=True,
+                # Not every OpenAI-compatible server accepts stream_options
+                **({"stream_options": {"include_usage": True}} if backend.base_url is None else {}),
+                timeout=timeout or backend.timeout_s,
+            )
+        except BaseException as e:
+            scheduler.release()
+            if isinstance(e, Exception):
+                record_usage(sister, call_site, backend.model, latency_s=time.perf_counter() - started, ok=False)
+            raise
+        return backend, stream, time.perf_counter() - opening
+
+    try:
+        backend, stream, provider_s = await call_routed(call_type_for(call_site), _open, retryable=_is_retryable)
+    except CircuitOpenError:
+        line = fallback_reply(sister)
+        if line:
+            yield line
+        return
+    except Exception as e:
+        print(f"[LLM ERROR] {sister} (stream): {e}")
+        return
+
+    # The provider stream is drained by a background task into a queue, so
+    # the scheduler slot is released as soon as the provider is done, never
+    # held while the consumer pauses between deltas (typing delays). Backend
+    # latency is likewise the provider's time only.
+    deltas: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+    async def _read():
+        nonlocal provider_s
+        reading = time.perf_counter()
+        first = True
+        usage = None
+        ok = True
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first:
+                        _record_latency("stream_first_token", started)
+                        first = False
+                    deltas.put_nowait(delta)
+        except Exception as e:
+            ok = False
+            backend.breaker.record_failure()
+            print(f"[LLM ERROR] {sister} (stream): {e}")
+        finally:
+            provider_s += time.perf_counter() - reading
+            if ok:
+                backend.record_latency(provider_s)
+                record_response_usage(sister, call_site, backend.model, usage, provider_s)
+            else:
+                record_usage(sister, call_site, backend.model, latency_s=provider_s, ok=False)
+            deltas.put_nowait(None)
+
+    reader = asyncio.create_task(_read())
+    # Released from a callback so a reader cancelled before it ran frees it too
+    reader.add_done_callback(lambda _: scheduler.release())
+    try:
+        while True:
+            delta = await deltas.get()
+            if delta is None:
+                break
+            yield delta
+    finally:
+        # The consumer stopped early (superseded, send failed): stop reading
+        if not reader.done():
+            reader.cancel()
+
+async def generate_multi_persona_reply(
+    sisters: List[str],
+    user_message: str,
+    theme,
+    role,
+    history=None,
+    timeout=None,
+    priority=PRIORITY_SIBLING,
+    channel_id=None,
+    call_site="batch_reply",
+    trigger_id=None,
+) -> Dict[str, str]:
+    """
+    One round trip for several sisters answering the same message. The model
+    returns a JSON object with one reply per sister; the shared context
+    (message, history, instructions) is only sent once.
+    Returns {} on failure so callers can fall back to per-sister replies.
+    """
+    profiles = "\n\n".join(
+        f"## {name}\n{load_personality_summary(name)}\n"
+        f"Special bias for {name}: {inject_personality_bias(name)}"
+        + (f"\nVoice: {_voices[name]}" if name in _voices else "")
+        for name in sisters
+    )
+    history, summary = _channel_context(history, channel_id, trigger_id)
     history_text = ""
+    if summary:
+        history_text += f"\nEarlier in this conversation: {summary}\n"
     if history:
-        history_text = "\nRecent conversation:\n" + "\n".join(
-            [f"{author}: {msg}" for author, msg in history[-6:]]
+        history_text += "\nRecent conversation:\n" + "\n".join(
+            [f"{author}: {msg}" for author, msg in history]
         )
+    names = ", ".join(sisters)
 
     system_prompt = f"""
-You are {sister}, part of a family group chat. 
-Your replies must always reflect your unique personality.
+You write replies for several siblings in a family group chat: {names}.
+Each reply must sound like that sibling alone — their quirks, tone and identity.
 
-Personality profile:
-{personality_summary}
+Personality profiles:
+{profiles}
 
 Theme for today: {theme}
 Current role: {role}
-- Lead → write 2–4 guiding sentences
-- Support → 1–2 playful/supportive sentences
-- Rest → very short remark
-- DM → intimate, natural
-- Autonomous → casual chat about leisure or beliefs
-
-Special bias for {sister}: {personality_bias}
 
 Instructions:
-- DO NOT prefix your replies with your own name.
-- Stay in character — {sister}’s quirks, tone, and identity must always show.
-- Avoid generic motivational platitudes unless they directly fit {sister}'s character.
-- Be reactive to the conversation and reference history naturally.
+- Answer with a JSON object whose keys are exactly: {names}. Each value is that sibling's reply.
+- Each reply is 1–3 sentences, written in the first person, with no name prefix.
+- Replies should differ in angle and wording; siblings may react to one another briefly.
+- Avoid generic motivational platitudes.
 
 {history_text}
 """
-
-    try:
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
+    async def _attempt(backend: Backend):
+        async with scheduler.slot(priority):
+            return await _complete(
+                backend,
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_message}
                 ],
-                max_tokens=160,
-                temperature=0.9,
-                presence_penalty=0.7,
-                frequency_penalty=0.6
+                timeout=timeout,
+                persona="+".join(sisters),
+                call_site=call_site,
+                max_tokens=120 * len(sisters),
+                response_format={"type": "json_object"},
             )
-        )
-        return response.choices[0].message.content.strip()
+
+    try:
+        raw = await call_routed(call_type_for(call_site), _attempt, retryable=_is_retryable)
+        data = json.loads(raw)
     except Exception as e:
-        print(f"[LLM ERROR] {sister}: {e}")
+        print(f"[LLM ERROR] batch {names}: {e}")
+        return {}
+    return {
+        name: data[name].strip()
+        for name in sisters
+        if isinstance(data.get(name), str) and data[name].strip()
+    }
+
+async def summarize_conversation(
+    previous_summary: Optional[str],
+    turns: List,
+    timeout=None,
+    priority=PRIORITY_BACKGROUND,
+) -> Optional[str]:
+    """
+    Fold `turns` ((author, message) pairs) into `previous_summary` and return
+    the updated running summary, or None if the call failed.
+    """
+    transcript = "\n".join(f"{author}: {msg}" for author, msg in turns)
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "You maintain a running summary of a family group chat. "
+                "Merge the new messages into the existing summary. Keep who said what, "
+                "plans, moods and open questions; drop small talk. "
+                "Write at most 120 words of plain prose, no lists."
+            ),
+        },
+        {
+            "role": "user",
+            "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}",
+        },
+    ]
+
+    async def _attempt(backend: Backend):
+        async with scheduler.slot(priority):
+            return await _complete(
+                backend,
+                messages,
+                timeout=timeout,
+                persona="system",
+                call_site="history_summary",
+                max_tokens=200,
+                temperature=0.3,
+                presence_penalty=0,
+                frequency_penalty=0,
+            )
+
+    try:
+        return await call_routed("summary", _attempt, retryable=_is_retryable)
+    except Exception as e:
+        print(f"[LLM ERROR] summary: {e}")
         return None
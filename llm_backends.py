@@ -0,0 +1,231 @@
+# llm_backends.py
+# OpenAI-compatible LLM backends and the router that picks one per call.
+#
+# - A backend is a base URL + model + API key env var (base_url None means
+#   api.openai.com); local inference servers that speak the OpenAI chat API
+#   (vLLM, llama.cpp, Ollama, LM Studio...) plug in the same way.
+# - Calls are routed by call type (reply / chatter / summary, derived from
+#   the usage_ledger call_site) to the backends listed for that type in
+#   config "llm_routing".
+# - A backend of type "fake" answers locally with deterministic text and
+#   simulated latency (fake_llm), for benchmarks without an API key.
+# - Among those, healthy backends (circuit not open) are tried fastest
+#   first by recent p50 latency; a backend with too few samples is tried
+#   first so it gets measured, and a small share of calls explores.
+
+import os
+import random
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+import httpx
+import openai
+
+from logger import log_event
+from fake_llm import FakeAsyncClient
+from llm_resilience import CircuitBreaker, CircuitOpenError, call_with_retries, get_breaker
+
+T = TypeVar("T")
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "10"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "5"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+LLM_ROUTER_EXPLORE = float(os.getenv("LLM_ROUTER_EXPLORE", "0.05"))
+LLM_ROUTER_MIN_SAMPLES = 5
+
+# usage_ledger call_site -> routing call type (anything else is "reply")
+CALL_TYPES = {
+    "handler": "reply",
+    "handle_dm": "reply",
+    "batch_reply": "reply",
+    "chatter": "chatter",
+    "chatter_pool": "chatter",
+    "random_sister_conversation": "chatter",
+    "history_summary": "summary",
+}
+
+
+def call_type_for(call_site: str) -> str:
+    return CALL_TYPES.get(call_site, "reply")
+
+
+class Backend:
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        base_url: Optional[str] = None,
+        api_key_env: Optional[str] = "OPENAI_API_KEY",
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        timeout_s: float = LLM_TIMEOUT_S,
+        kind: str = "openai",
+        options: Optional[Dict] = None,
+    ):
+        self.name = name
+        self.kind = kind
+        self.options = dict(options or {})
+        self.model = model
+        self.base_url = base_url
+        self.api_key_env = api_key_env
+        self.max_connections = max(1, max_connections)
+        self.timeout_s = timeout_s
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._latency: Deque[float] = deque(maxlen=200)
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return get_breaker(self.name)
+
+    def client(self):
+        """
+        This backend's client, created on first use: a pooled AsyncOpenAI,
+        or a FakeAsyncClient for type "fake".
+        """
+        if self._client is None and self.kind == "fake":
+            self._client = FakeAsyncClient(
+                latency=self.options.get("latency"),
+                seed=int(self.options.get("seed", 0)),
+            )
+        if self._client is None:
+            http_client = openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=min(LLM_MAX_KEEPALIVE, self.max_connections),
+                ),
+                timeout=httpx.Timeout(self.timeout_s, connect=5.0),
+            )
+            # Local servers usually ignore the key, but the client requires one
+            api_key = (os.getenv(self.api_key_env) if self.api_key_env else None) or "unused"
+            self._client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=self.base_url,
+                http_client=http_client,
+                max_retries=0,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def record_latency(self, seconds: float):
+        self._latency.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._latency:
+            return None
+        ordered = sorted(self._latency)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> Dict:
+        def _ms(q):
+            v = self.percentile(q)
+            return round(1000 * v, 1) if v is not None else None
+        return {
+            "type": self.kind,
+            "model": self.model,
+            "base_url": self.base_url or "https://api.openai.com/v1",
+            "samples": len(self._latency),
+            "p50_ms": _ms(0.5),
+            "p90_ms": _ms(0.9),
+            "p99_ms": _ms(0.99),
+            "circuit": self.breaker.state,
+        }
+
+
+_backends: Dict[str, Backend] = {"openai": Backend("openai", LLM_MODEL)}
+_routes: Dict[str, List[str]] = {}
+
+
+def configure_backends(config: Dict):
+    """
+    Load "llm_backends" (list of {name, type, model, base_url, api_key_env,
+    max_connections, timeout_s, enabled}, plus latency/seed for type "fake")
+    and "llm_routing" ({call_type: [backend names]}, with "default" as the
+    fallback list) from config.
+    Without "llm_backends" the single default OpenAI backend is kept.
+    """
+    global _backends, _routes
+    entries = config.get("llm_backends") or []
+    backends: Dict[str, Backend] = {}
+    for entry in entries:
+        if not entry.get("enabled", True):
+            continue
+        try:
+            backends[entry["name"]] = Backend(
+                name=entry["name"],
+                model=entry.get("model") or LLM_MODEL,
+                base_url=entry.get("base_url"),
+                api_key_env=entry.get("api_key_env", "OPENAI_API_KEY"),
+                max_connections=int(entry.get("max_connections", LLM_MAX_CONNECTIONS)),
+                timeout_s=float(entry.get("timeout_s", LLM_TIMEOUT_S)),
+                kind=entry.get("type", "openai"),
+                options=entry,
+            )
+        except KeyError:
+            log_event(f"[WARN] LLM backend entry without a name skipped: {entry}")
+    if backends:
+        _backends = backends
+    _routes = {
+        call_type: [n for n in names if n in _backends]
+        for call_type, names in (config.get("llm_routing") or {}).items()
+    }
+    log_event(f"[LLM] Backends: {', '.join(_backends)}; routes: {_routes or 'all'}")
+
+
+def ranked_backends(call_type: str) -> List[Backend]:
+    """Backends for `call_type`, healthy ones first, fastest (p50) first."""
+    names = _routes.get(call_type) or _routes.get("default") or list(_backends)
+    candidates = [_backends[n] for n in names if n in _backends]
+    healthy = [b for b in candidates if b.breaker.available()]
+    unhealthy = [b for b in candidates if b not in healthy]
+
+    if len(healthy) > 1 and random.random() < LLM_ROUTER_EXPLORE:
+        random.shuffle(healthy)
+    else:
+        # Under-sampled backends sort first so they get measured;
+        # the stable sort keeps the configured order between equals.
+        healthy.sort(key=lambda b: (
+            b.percentile(0.5) if len(b._latency) >= LLM_ROUTER_MIN_SAMPLES else 0.0
+        ))
+    return healthy + unhealthy
+
+
+async def call_routed(
+    call_type: str,
+    fn: Callable[[Backend], Awaitable[T]],
+    *,
+    retryable: Callable[[Exception], bool],
+) -> T:
+    """
+    Run fn(backend) with retries on the best backend for `call_type`,
+    failing over to the next one when its circuit is open or its retries
+    are exhausted. Raises CircuitOpenError if every backend's circuit is
+    open, otherwise the last error.
+    """
+    last_error: Optional[Exception] = None
+    for backend in ranked_backends(call_type):
+        try:
+            return await call_with_retries(lambda: fn(backend), breaker=backend.breaker, retryable=retryable)
+        except CircuitOpenError as e:
+            last_error = last_error or e
+        except Exception as e:
+            if not retryable(e):
+                raise
+            last_error = e
+            log_event(f"[LLM] Backend {backend.name} failed for {call_type}, trying next: {e}")
+    raise last_error or CircuitOpenError(call_type)
+
+
+async def close_backends():
+    for backend in _backends.values():
+        await backend.close()
+
+
+def get_backend_stats() -> Dict:
+    return {
+        "backends": {name: b.snapshot() for name, b in _backends.items()},
+        "routes": _routes or {"default": list(_backends)},
+    }
@@ -0,0 +1,156 @@
+# llm_resilience.py
+# Bounded retries with jittered exponential backoff, plus a per-provider
+# circuit breaker so a failing provider is skipped instantly instead of
+# stalling every reply behind its timeouts.
+
+import os
+import time
+import random
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from logger import log_event
+
+T = TypeVar("T")
+
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+LLM_RETRY_BASE_S = float(os.getenv("LLM_RETRY_BASE_S", "0.5"))
+LLM_RETRY_MAX_S = float(os.getenv("LLM_RETRY_MAX_S", "4"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the provider's breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    closed → open after `failure_threshold` consecutive failures;
+    open → half_open once `reset_after_s` has passed (one probe call allowed);
+    half_open → closed on success, back to open on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_after_s: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_after_s = reset_after_s
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.total_failures = 0
+        self.total_trips = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - (self.opened_at or 0) < self.reset_after_s:
+                return False
+            self.state = "half_open"
+            self._probe_in_flight = False
+        # half_open: let exactly one probe through
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def available(self) -> bool:
+        """Whether allow() would currently admit a call (without claiming a probe)."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - (self.opened_at or 0) >= self.reset_after_s
+        return not self._probe_in_flight
+
+    def record_success(self):
+        if self.state != "closed":
+            log_event(f"[LLM] Circuit {self.name} closed")
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.total_failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.total_trips += 1
+                log_event(f"[LLM] Circuit {self.name} opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """Forget an in-flight half-open probe that ended without a verdict."""
+        self._probe_in_flight = False
+
+    def snapshot(self) -> Dict:
+        retry_in = None
+        if self.state == "open" and self.opened_at is not None:
+            retry_in = round(max(0.0, self.reset_after_s - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "total_failures": self.total_failures,
+            "trips": self.total_trips,
+            "retry_in_s": retry_in,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = CircuitBreaker(provider, LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET_S)
+        _breakers[provider] = breaker
+    return breaker
+
+
+def get_breaker_states() -> Dict[str, Dict]:
+    return {name: b.snapshot() for name, b in _breakers.items()}
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given 0-based attempt."""
+    return random.uniform(0, min(LLM_RETRY_MAX_S, LLM_RETRY_BASE_S * (2 ** attempt)))
+
+
+async def call_with_retries(
+    fn: Callable[[], Awaitable[T]],
+    *,
+    breaker: CircuitBreaker,
+    retryable: Callable[[Exception], bool] = lambda e: True,
+    attempts: int = LLM_RETRY_ATTEMPTS,
+) -> T:
+    """
+    Run `fn` up to `attempts` times, feeding each outcome into `breaker`.
+    Raises CircuitOpenError as soon as the breaker refuses a call, or the
+    last error once attempts are exhausted / the error is not retryable.
+    """
+    for attempt in range(max(1, attempts)):
+        if not breaker.allow():
+            raise CircuitOpenError(breaker.name)
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            if not retryable(e):
+                # Caller-side errors (bad request, auth) say nothing about
+                # provider health, so they do not count against the breaker.
+                breaker.release_probe()
+                raise
+            breaker.record_failure()
+            if attempt >= attempts - 1:
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        breaker.record_success()
+        return result
+    raise CircuitOpenError(breaker.name)
@@ -0,0 +1,150 @@
+# llm_scheduler.py
+# Central admission control for LLM calls shared by all five personas.
+#
+# - Concurrency cap: at most N completions in flight at once
+# - Token bucket: sustained request rate with a small burst allowance
+# - Priority lanes: waiting callers are admitted strictly by lane, FIFO
+#   within a lane, so a human waiting on a reply never queues behind
+#   background chatter.
+
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List, Optional, Tuple
+
+# ---------------------------------------------------------------------------
+# Priority lanes (lower = served first)
+# ---------------------------------------------------------------------------
+PRIORITY_HUMAN = 0       # direct replies to a human (channel or DM)
+PRIORITY_SIBLING = 1     # sibling-to-sibling replies and chatter loops
+PRIORITY_BACKGROUND = 2  # rituals, autonomy bursts, housekeeping
+
+LANE_NAMES = ["human", "sibling", "background"]
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_RATE_PER_MIN = float(os.getenv("LLM_RATE_PER_MIN", "60"))
+LLM_BURST = float(os.getenv("LLM_BURST", "10"))
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int, rate_per_min: float, burst: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_per_s = max(0.001, rate_per_min / 60.0)
+        self.burst = max(1.0, burst)
+
+        self._lanes: List[Deque[Tuple[asyncio.Future, float]]] = [
+            deque() for _ in LANE_NAMES
+        ]
+        self._in_flight = 0
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self._admitted = [0] * len(LANE_NAMES)
+        self._wait_total = [0.0] * len(LANE_NAMES)
+        self._wait_max = [0.0] * len(LANE_NAMES)
+
+    # ---------- token bucket ----------
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_s)
+        self._last_refill = now
+
+    def _schedule_wakeup(self):
+        if self._timer is not None:
+            return
+        delay = (1.0 - self._tokens) / self.rate_per_s
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(max(0.01, delay), self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    # ---------- admission ----------
+    def _next_waiter(self) -> Optional[Tuple[int, asyncio.Future, float]]:
+        for lane_idx, lane in enumerate(self._lanes):
+            while lane and lane[0][0].done():
+                lane.popleft()  # cancelled while queued
+            if lane:
+                fut, enqueued = lane.popleft()
+                return lane_idx, fut, enqueued
+        return None
+
+    def _has_waiters(self) -> bool:
+        return any(not fut.done() for lane in self._lanes for fut, _ in lane)
+
+    def _dispatch(self):
+        while self._in_flight < self.max_concurrency and self._has_waiters():
+            self._refill()
+            if self._tokens < 1.0:
+                self._schedule_wakeup()
+                return
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            lane_idx, fut, enqueued = waiter
+            self._tokens -= 1.0
+            self._in_flight += 1
+            waited = time.monotonic() - enqueued
+            self._admitted[lane_idx] += 1
+            self._wait_total[lane_idx] += waited
+            self._wait_max[lane_idx] = max(self._wait_max[lane_idx], waited)
+            fut.set_result(None)
+
+    async def acquire(self, priority: int = PRIORITY_SIBLING):
+        lane_idx = min(max(int(priority), 0), len(self._lanes) - 1)
+        fut = asyncio.get_running_loop().create_future()
+        self._lanes[lane_idx].append((fut, time.monotonic()))
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # Admitted just as we were cancelled: hand the slot back.
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self._in_flight = max(0, self._in_flight - 1)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_SIBLING):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    # ---------- stats ----------
+    def stats(self) -> Dict:
+        lanes = {}
+        for idx, name in enumerate(LANE_NAMES):
+            admitted = self._admitted[idx]
+            lanes[name] = {
+                "queued": sum(1 for fut, _ in self._lanes[idx] if not fut.done()),
+                "admitted": admitted,
+                "avg_wait_ms": round(1000 * self._wait_total[idx] / admitted, 1) if admitted else None,
+                "max_wait_ms": round(1000 * self._wait_max[idx], 1),
+            }
+        self._refill()
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "tokens": round(self._tokens, 2),
+            "rate_per_min": round(self.rate_per_s * 60, 1),
+            "lanes": lanes,
+        }
+
+    def queue_depth(self) -> int:
+        return sum(1 for lane in self._lanes for fut, _ in lane if not fut.done())
+
+
+scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_RATE_PER_MIN, LLM_BURST)
+
+
+def get_scheduler_stats() -> Dict:
+    return scheduler.stats()
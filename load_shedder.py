@@ -0,0 +1,111 @@
+# load_shedder.py
+# Scales optional LLM work down when the pipeline is under pressure, so
+# human-directed replies keep their latency.
+#
+# Pressure (0..1) is the worst of three signals, each normalised to 0..1:
+#   - backlog: callers queued at the LLM scheduler + events on the bus
+#   - latency: p90 of the fastest healthy backend, between latency_low_ms
+#     and latency_high_ms
+#   - errors: share of backends whose circuit is not closed
+# It is smoothed (fast to rise, slow to fall) and recomputed at most once a
+# second. Each kind of optional work is then scaled by 1 - sensitivity *
+# pressure: chatter sheds fully, sibling-to-sibling replies more gently.
+# Human replies are never scaled. The "autonomy" kind gates
+# Autonomy.autonomy.random_sister_conversation, which nothing schedules yet.
+
+import time
+import random
+from typing import Dict
+
+from logger import log_event
+from llm_scheduler import scheduler
+from llm_backends import get_backend_stats
+from event_bus import get_event_bus_stats
+
+QUEUE_HIGH = 8
+LATENCY_LOW_MS = 2000.0
+LATENCY_HIGH_MS = 8000.0
+RISE = 0.6
+FALL = 0.1
+UPDATE_EVERY_S = 1.0
+
+SENSITIVITY: Dict[str, float] = {
+    "chatter": 1.0,
+    "autonomy": 1.0,
+    "sibling_reply": 0.7,
+}
+
+_pressure = 0.0
+_signals: Dict[str, float] = {"backlog": 0.0, "latency": 0.0, "errors": 0.0}
+_updated = 0.0
+_stats = {"shed": {kind: 0 for kind in SENSITIVITY}, "admitted": {kind: 0 for kind in SENSITIVITY}}
+_shedding = False
+
+
+def configure_load_shedder(config: Dict):
+    """Thresholds from config "load_shedding" (queue_high, latency_low_ms, latency_high_ms, sensitivity)."""
+    global QUEUE_HIGH, LATENCY_LOW_MS, LATENCY_HIGH_MS
+    cfg = config.get("load_shedding") or {}
+    QUEUE_HIGH = int(cfg.get("queue_high", QUEUE_HIGH))
+    LATENCY_LOW_MS = float(cfg.get("latency_low_ms", LATENCY_LOW_MS))
+    LATENCY_HIGH_MS = float(cfg.get("latency_high_ms", LATENCY_HIGH_MS))
+    SENSITIVITY.update({k: float(v) for k, v in (cfg.get("sensitivity") or {}).items()})
+
+
+def _measure() -> Dict[str, float]:
+    backlog = scheduler.queue_depth() + get_event_bus_stats()["depth"]
+
+    backends = list(get_backend_stats()["backends"].values())
+    healthy_p90 = [b["p90_ms"] for b in backends if b["circuit"] == "closed" and b["p90_ms"] is not None]
+    latency = min(healthy_p90) if healthy_p90 else None
+    unhealthy = sum(1 for b in backends if b["circuit"] != "closed")
+
+    span = max(1.0, LATENCY_HIGH_MS - LATENCY_LOW_MS)
+    return {
+        "backlog": min(1.0, backlog / max(1, QUEUE_HIGH)),
+        "latency": min(1.0, max(0.0, (latency - LATENCY_LOW_MS) / span)) if latency is not None else 0.0,
+        "errors": unhealthy / len(backends) if backends else 0.0,
+    }
+
+
+def pressure() -> float:
+    """Current smoothed pipeline pressure, 0 (idle) .. 1 (overloaded)."""
+    global _pressure, _updated, _signals, _shedding
+    now = time.monotonic()
+    if now - _updated < UPDATE_EVERY_S:
+        return _pressure
+    _updated = now
+    _signals = _measure()
+    target = max(_signals.values())
+    _pressure += (target - _pressure) * (RISE if target > _pressure else FALL)
+    if (_pressure >= 0.5) != _shedding:
+        _shedding = _pressure >= 0.5
+        log_event(f"[LOAD] {'Shedding' if _shedding else 'Recovered'}: pressure={_pressure:.2f} {_signals}")
+    return _pressure
+
+
+def scale(kind: str) -> float:
+    """Multiplier (0..1) for the probability of optional work of `kind`."""
+    return max(0.0, 1.0 - SENSITIVITY.get(kind, 0.0) * pressure())
+
+
+def scaled(chance: float, kind: str) -> float:
+    return chance * scale(kind)
+
+
+def admit(kind: str) -> bool:
+    """Randomly admit a unit of `kind` work with probability scale(kind)."""
+    ok = random.random() < scale(kind)
+    counts = _stats["admitted" if ok else "shed"]
+    counts[kind] = counts.get(kind, 0) + 1
+    return ok
+
+
+def get_load_shedder_stats() -> Dict:
+    current = pressure()
+    return {
+        "pressure": round(current, 3),
+        "signals": {k: round(v, 3) for k, v in _signals.items()},
+        "scale": {kind: round(scale(kind), 3) for kind in SENSITIVITY},
+        **_stats,
+    }
@@ -1,7 +1,7 @@
 import os
 from datetime import datetime
 
-LOG_DIR = "data"
+LOG_DIR = os.environ.get("LOG_DIR", "data")
 LOG_FILE = os.path.join(LOG_DIR, "memory_log.txt")
 ARCHIVE_DIR = os.path.join(LOG_DIR, "log_archive")
 MAX_LOG_SIZE = 1 * 1024 * 1024  # 1 MB
@@ -15,22 +15,51 @@ from Autonomy.state_manager import state, load_state, save_state
 from workouts import get_today_workout
 from nutrition import summarize_daily_nutrition
 from image_utils import generate_and_post_outfits
+from llm import close_llm_client, get_llm_latency_stats, generate_multi_persona_reply
+from llm_scheduler import get_scheduler_stats, PRIORITY_HUMAN, PRIORITY_SIBLING
+from persona_cache import get_persona_cache_stats
+from prompt_compiler import get_prompt_stats
+from llm_resilience import get_breaker_states
+from llm_backends import configure_backends, get_backend_stats
+from conversation_history import configure_history, record_message, get_history_stats, load_summaries
+from history_compactor import configure_compactor, history_compactor_loop, get_compactor_stats
+from chatter_pool import get_chatter_pool_stats
+from response_cache import get_response_cache_stats
+from usage_ledger import get_usage, flush_ledger
+from inflight import run_latest, in_flight_message_id, get_inflight_stats
+from messaging_utils import SendOrder, send_turn
+from message_features import extract_features
+from schedule_service import configure_schedules, is_online, get_schedule_stats
+from event_bus import start_event_bus, publish_event, stop_event_bus, get_event_bus_stats
+from cascade import configure_cascade, position_for, allow_reply, allow_reaction, spend, refund, get_cascade_stats
+from load_shedder import configure_load_shedder, get_load_shedder_stats
+from rate_limiter import configure_rate_limits, take_token, refund_token, drop_legacy_cooldowns, get_rate_limit_stats
+from rest_persona import RestPersona, close_rest_personas
+from reaction_tier import react_to_message, get_reaction_stats
 
 # 🔸 Routing utilities
 from routing_utils import (
     build_sister_id_map,
     identify_sender,
     should_process_message_once,
+    get_dedup_stats,
     should_reply,
-    passes_global_cooldown,
+    reply_tier,
 )
 
 # ---------------------------------------------------------------------------
 # Load config
 # ---------------------------------------------------------------------------
-CONFIG_PATH = "/app/config.json"
+CONFIG_PATH = os.getenv("CONFIG_PATH", "/app/config.json")
 with open(CONFIG_PATH, "r", encoding="utf-8") as f:
     config = json.load(f)
+configure_history(config)
+configure_backends(config)
+configure_compactor(config)
+configure_schedules(config)
+configure_rate_limits(config)
+configure_cascade(config)
+configure_load_shedder(config)
 
 AEDT = pytz.timezone("Australia/Sydney")
 app = FastAPI()
@@ -46,7 +75,16 @@ intents.message_content = True
 # ---------------------------------------------------------------------------
 # Bot factory
 # ---------------------------------------------------------------------------
+# gateway.mode "single" (opt-in; default "multi"): only gateway.listener
+# connects to the gateway and dispatches events; the other personas post over
+# REST only. See rest_persona for what the listener needs.
+GATEWAY = config.get("gateway") or {}
+SINGLE_GATEWAY = GATEWAY.get("mode") == "single"
+GATEWAY_LISTENER = GATEWAY.get("listener", "Aria")
+
 def create_bot(name: str, env_var: str):
+    if SINGLE_GATEWAY and name != GATEWAY_LISTENER:
+        return RestPersona(name, env_var)
     bot = commands.Bot(command_prefix="!", intents=intents)
     bot.sister_info = {"name": name, "env_var": env_var}
     return bot
@@ -76,32 +114,22 @@ BEHAVIOR_HANDLERS = {
     "Will": will_handle_message,
 }
 
-# ---------------------------------------------------------------------------
-# Awake logic
-# ---------------------------------------------------------------------------
-def is_awake(sister_name: str) -> bool:
-    schedule = config.get("schedules", {}).get(
-        sister_name,
-        {"wake": [6, 8], "sleep": [22, 23]},
-    )
-    now_h = datetime.now(AEDT).hour
-    start, end = int(schedule["wake"][0]), int(schedule["sleep"][1])
-    if start <= end:
-        return start <= now_h < end
-    return now_h >= start or now_h < end
-
 # ---------------------------------------------------------------------------
 # Family message routing (CORE FIX)
 # ---------------------------------------------------------------------------
-async def on_family_message(message: discord.Message):
+def receive_family_message(message: discord.Message):
+    """Gateway receipt: filter and queue for the routing workers (never blocks)."""
     # Only handle messages in family channel
     if int(message.channel.id) != int(config["family_group_channel"]):
         return
 
     # Deduplicate: every bot receives the same gateway event
-    if not should_process_message_once(state, int(message.id), ttl_seconds=90):
+    if not should_process_message_once(int(message.id), ttl_seconds=90):
         return
 
+    publish_event(message)
+
+async def on_family_message(message: discord.Message):
     # Build / refresh sister_id_map
     routing = state.setdefault("routing", {})
     sister_id_map = routing.get("sister_id_map")
@@ -116,7 +144,30 @@ async def on_family_message(message: discord.Message):
     if ctx.sender_is_bot and not ctx.sender_sister:
         return
 
-    # Iterate siblings to see who replies
+    # Channel history (our own sends are already recorded by message ID)
+    record_message(
+        ctx.channel_id,
+        ctx.sender_sister or ctx.sender_display,
+        ctx.content,
+        message_id=ctx.message_id,
+    )
+
+    # Keyword scans shared by every handler
+    features = extract_features(ctx.content)
+
+    # Where this message sits in its reply thread (human messages are roots).
+    # A sibling's reply may arrive here before its send returned and linked
+    # it, so its parent is resolved from the reply reference or from what
+    # the sender is still replying to.
+    parent_id = None
+    if ctx.sender_sister:
+        parent_id = ctx.reply_to_id or in_flight_message_id(ctx.sender_sister, ctx.channel_id)
+    position = position_for(ctx.message_id, parent_id, from_sibling=bool(ctx.sender_sister))
+
+    # Iterate siblings to see who replies (LLM) and who just reacts
+    eligible = []
+    reactors = []
+    charged = set()
     for bot in sisters:
         sister_name = bot.sister_info["name"]
 
@@ -125,40 +176,107 @@ async def on_family_message(message: discord.Message):
             continue
 
         # Must be awake
-        if not is_awake(sister_name):
+        if not is_online(sister_name):
             continue
 
-        # Global cooldown (per sister per channel)
-        if not passes_global_cooldown(
-            state,
-            sister_name,
-            ctx.channel_id,
-            cooldown_s=110,
-        ):
+        # The handler's own send gates, checked before any batched generation
+        if not bot.is_ready() or bot.get_channel(config["family_group_channel"]) is None:
             continue
 
         # Probability gate (handles mentions, replies, sibling chatter, humans)
         if not should_reply(state, sister_name, ctx):
             continue
 
-        handler = BEHAVIOR_HANDLERS.get(sister_name)
-        if not handler:
+        # Low-signal messages get an emoji / short ack: no LLM, token or budget
+        if reply_tier(sister_name, ctx, features) == "react":
+            if allow_reaction(position):
+                reactors.append(bot)
             continue
 
+        # Bot-to-bot cascades: depth limit, damping and per-thread budget
+        if not allow_reply(position):
+            continue
+
+        if sister_name not in BEHAVIOR_HANDLERS:
+            continue
+
+        # Reply budget (per sister per channel); being addressed directly is exempt
+        addressed = sister_name in ctx.mentioned_sisters or ctx.reply_to_sister == sister_name
+        if not addressed:
+            if not take_token(sister_name, ctx.channel_id):
+                continue
+            charged.add(sister_name)
+        spend(position)
+        eligible.append(sister_name)
+
+    # Several siblings answering the same message: one combined LLM request
+    conv_cfg = config.get("conversation") or {}
+    prepared = {}
+    if len(eligible) > 1 and conv_cfg.get("batch_replies"):
+        prepared = await generate_multi_persona_reply(
+            eligible,
+            user_message=(
+                f'{ctx.author_label} said in the family group chat: "{ctx.content}". '
+                "Each sibling replies to it directly, specific to what was said."
+            ),
+            theme=None,
+            role="sister",
+            priority=PRIORITY_SIBLING if ctx.sender_is_bot else PRIORITY_HUMAN,
+            channel_id=ctx.channel_id,
+            trigger_id=ctx.message_id,
+        )
+        log_event(f"[BATCH] {len(prepared)}/{len(eligible)} replies from one request")
+
+    # Replies generate concurrently (as scheduler slots allow); sends go out
+    # one after another, with whoever was addressed first
+    eligible.sort(key=lambda n: n not in ctx.mentioned_sisters and n != ctx.reply_to_sister)
+    send_order = SendOrder(eligible, stagger_s=tuple(conv_cfg.get("send_stagger_s", (1.5, 4.0))))
+
+    async def _reply(sister_name: str):
+        handler = BEHAVIOR_HANDLERS[sister_name]
+        replied = False
         try:
-            await handler(
-                state=state,
-                config=config,
-                sisters=sisters,
-                ctx=ctx,
-                message=message,
-            )
-            log_event(
-                f"[CHAT] {sister_name} replied "
-                f"(sender={ctx.sender_display}, sender_sister={ctx.sender_sister})"
-            )
+            with send_turn(send_order, sister_name):
+                # A newer message for the same sister supersedes this reply
+                replied = await run_latest(
+                    sister_name,
+                    ctx.channel_id,
+                    ctx.message_id,
+                    handler(
+                        state=state,
+                        config=config,
+                        sisters=sisters,
+                        author_label=ctx.author_label,
+                        content=ctx.content,
+                        channel_id=ctx.channel_id,
+                        discord_author_name=ctx.sender_display,
+                        discord_author_is_bot=ctx.sender_is_bot,
+                        reply=prepared.get(sister_name),
+                        features=features,
+                    ),
+                )
+            if replied:
+                log_event(
+                    f"[CHAT] {sister_name} replied "
+                    f"(sender={ctx.sender_display}, sender_sister={ctx.sender_sister})"
+                )
         except Exception as e:
             log_event(f"[ERROR] {sister_name} failed reply: {e}")
+        if not replied:
+            # Declined, superseded or failed: the reply and thread budgets only pay for sends
+            refund(position)
+            if sister_name in charged:
+                refund_token(sister_name, ctx.channel_id)
+
+    async def _react(bot):
+        try:
+            await react_to_message(
+                bot, ctx.channel_id, ctx.message_id, content=ctx.content, emoji_only=features.emoji_only
+            )
+        except Exception as e:
+            log_event(f"[ERROR] {bot.sister_info['name']} failed reaction: {e}")
+
+    await asyncio.gather(*(_reply(name) for name in eligible), *(_react(bot) for bot in reactors))
 
 # ---------------------------------------------------------------------------
 # Ritual messages
@@ -169,7 +287,8 @@ async def post_to_family(message: str, sender: str):
         if bot.sister_info["name"] == sender and bot.is_ready():
             ch = bot.get_channel(channel_id)
             if ch:
-                await ch.send(message)
+                sent = await ch.send(message)
+                record_message(channel_id, sender, message, message_id=getattr(sent, "id", None))
             return
 
 async def send_morning_message():
@@ -202,10 +321,10 @@ async def bind_listeners(bot: commands.Bot):
 
     @bot.event
     async def on_message(message: discord.Message):
-        # Ignore own messages
-        if message.author == bot.user:
+        # Ignore own messages (in single-gateway mode no other bot sees them)
+        if message.author == bot.user and not SINGLE_GATEWAY:
             return
-        await on_family_message(message)
+        receive_family_message(message)
 
 # ---------------------------------------------------------------------------
 # Startup helpers
@@ -220,11 +339,14 @@ def setup_siblings():
 
 async def start_bots():
     for bot in sisters:
-        await bind_listeners(bot)
         token = os.getenv(bot.sister_info["env_var"])
         if not token:
             log_event(f"[ERROR] Missing token for {bot.sister_info['name']}")
             continue
+        if isinstance(bot, RestPersona):
+            asyncio.create_task(bot.start(token))
+            continue
+        await bind_listeners(bot)
         asyncio.create_task(bot.start(token))
         await asyncio.sleep(2)
 
@@ -261,11 +383,53 @@ async def daily_ritual_loop():
 @app.on_event("startup")
 async def startup_event():
     load_state()
+    drop_legacy_cooldowns(state)
+    load_summaries()
     setup_siblings()
+    start_event_bus(on_family_message)
     asyncio.create_task(start_bots())
     asyncio.create_task(daily_ritual_loop())
+    asyncio.create_task(history_compactor_loop())
     log_event("[SYSTEM] All systems active.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_event_bus()
+    await close_rest_personas(sisters)
+    await close_llm_client()
+    flush_ledger()
+
 @app.get("/health")
 def health():
-    return {"status": "ok", "time": datetime.now(AEDT).isoformat()}
+    return {
+        "status": "ok",
+        "time": datetime.now(AEDT).isoformat(),
+        "llm_breakers": get_breaker_states(),
+    }
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "llm": get_llm_latency_stats(),
+        "llm_backends": get_backend_stats(),
+        "llm_scheduler": get_scheduler_stats(),
+        "persona_cache": get_persona_cache_stats(),
+        "prompts": get_prompt_stats(),
+        "history": get_history_stats(),
+        "history_compactor": get_compactor_stats(),
+        "chatter_pool": get_chatter_pool_stats(),
+        "response_cache": get_response_cache_stats(),
+        "inflight": get_inflight_stats(),
+        "dedup": get_dedup_stats(),
+        "schedules": get_schedule_stats(),
+        "rate_limits": get_rate_limit_stats(),
+        "event_bus": get_event_bus_stats(),
+        "cascade": get_cascade_stats(),
+        "load_shedding": get_load_shedder_stats(),
+        "reactions": get_reaction_stats(),
+    }
+
+@app.get("/usage")
+def usage(window: str = "hour", periods: int = 1, group_by: str = "persona"):
+    """LLM token/cost/latency totals; window=hour|day, group_by=persona|call_site|both."""
+    return get_usage(window=window, periods=periods, group_by=group_by)
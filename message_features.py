@@ -0,0 +1,124 @@
+# message_features.py
+# Keyword features of an incoming message, computed once and shared by every
+# persona handler instead of each one lowercasing and scanning it again.
+#
+# All keyword families (per-persona media hooks, outfit triggers, data_manager
+# commands/categories) are matched in one pass by a single compiled regex.
+# Matching keeps the old `keyword in lowered` substring semantics: every
+# keyword occurring anywhere in the text is found, overlaps included.
+# It also flags low-signal messages (emoji only, one or two words) that the
+# reaction tier answers without an LLM call.
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+
+# Topics that make a persona reach for a media reference in her reply
+MEDIA_HOOK_KEYWORDS: Dict[str, List[str]] = {
+    "Aria": ["anime", "game", "show", "movie", "book", "music"],
+    "Selene": ["show", "anime", "movie", "soundtrack", "music"],
+    "Cassandra": ["doc", "plan", "show", "film", "music", "anime", "gym", "lift", "workout"],
+    "Ivy": ["outfit", "style", "engine", "scooter", "game", "anime", "music"],
+    "Will": ["anime", "game", "show", "music", "cosplay", "art", "photo", "coffee"],
+}
+
+# Clothing references that trigger an outfit post (outfit_manager)
+OUTFIT_KEYWORDS: List[str] = [
+    "outfit", "clothes", "wearing", "dress", "hoodie", "skirt", "shirt", "jeans", "coat",
+    "jacket", "layer", "change", "cold", "hot", "warm", "style", "fashion", "comfy", "look"
+]
+
+# data_manager command verbs, and its categories in detection priority order
+DATA_READ_KEYWORDS: List[str] = ["show", "get", "list", "history"]
+DATA_LOG_KEYWORDS: List[str] = ["log", "record", "note"]
+DATA_CATEGORY_KEYWORDS: "OrderedDict[str, List[str]]" = OrderedDict([
+    ("plug", ["plug", "buttplug"]),
+    ("chastity", ["chastity", "cage"]),
+    ("anal", ["anal", "dilate"]),
+    ("oral", ["oral", "mouth"]),
+    ("training", ["training", "exercise"]),
+    ("denial", ["denial", "edge", "ruin"]),
+])
+
+FAMILIES: Dict[str, List[str]] = {
+    **{f"media:{name}": words for name, words in MEDIA_HOOK_KEYWORDS.items()},
+    "outfit": OUTFIT_KEYWORDS,
+    "data_read": DATA_READ_KEYWORDS,
+    "data_log": DATA_LOG_KEYWORDS,
+    **{f"data:{cat}": words for cat, words in DATA_CATEGORY_KEYWORDS.items()},
+}
+
+_ALL_KEYWORDS = sorted({w for words in FAMILIES.values() for w in words}, key=len, reverse=True)
+# A zero-width lookahead tries every start position, so overlapping keywords
+# ("photo" / "hot") are all reported; at one position the longest wins and
+# the shorter keywords it starts with are added back via _PREFIXES.
+_MATCHER = re.compile("(?=(" + "|".join(re.escape(w) for w in _ALL_KEYWORDS) + "))")
+_PREFIXES: Dict[str, List[str]] = {
+    w: [k for k in _ALL_KEYWORDS if w.startswith(k)] for w in _ALL_KEYWORDS
+}
+_FAMILY_SETS: Dict[str, FrozenSet[str]] = {name: frozenset(words) for name, words in FAMILIES.items()}
+
+# Emoji-only messages: custom <:name:id> emoji, or symbols with no letters
+# or digits (at least one non-ASCII, so a bare "?" or "..." doesn't count)
+_CUSTOM_EMOJI = re.compile(r"<a?:\w+:\d+>")
+_NO_WORDS = re.compile(r"^[^\w]*$")
+# "lol", "ok ty", "good night": short, no question, nothing to answer
+LOW_SIGNAL_MAX_WORDS = 2
+LOW_SIGNAL_MAX_CHARS = 15
+
+
+@dataclass(frozen=True)
+class MessageFeatures:
+    content: str
+    lowered: str
+    keywords: FrozenSet[str]
+    words: int = 0
+    emoji_only: bool = False
+
+    def has_any(self, family: str) -> bool:
+        return not self.keywords.isdisjoint(_FAMILY_SETS.get(family, frozenset()))
+
+    def media_hook(self, persona: str) -> bool:
+        return self.has_any(f"media:{persona}")
+
+    @property
+    def wants_outfit(self) -> bool:
+        return self.has_any("outfit")
+
+    @property
+    def data_category(self) -> Optional[str]:
+        for cat in DATA_CATEGORY_KEYWORDS:
+            if self.has_any(f"data:{cat}"):
+                return cat
+        return None
+
+    @property
+    def low_signal(self) -> bool:
+        """Nothing here to answer: emoji only, or a short remark without a question."""
+        if self.emoji_only:
+            return True
+        text = self.lowered.strip()
+        return (
+            0 < self.words <= LOW_SIGNAL_MAX_WORDS
+            and len(text) <= LOW_SIGNAL_MAX_CHARS
+            and "?" not in text
+        )
+
+
+def extract_features(content: str) -> MessageFeatures:
+    lowered = (content or "").lower()
+    found = set()
+    for m in _MATCHER.finditer(lowered):
+        found.update(_PREFIXES[m.group(1)])
+    stripped = _CUSTOM_EMOJI.sub(" ", lowered).strip()
+    emoji_only = bool(lowered.strip()) and _NO_WORDS.match(stripped) is not None and (
+        stripped != lowered.strip() or any(ord(c) > 127 for c in stripped)
+    )
+    return MessageFeatures(
+        content=content or "",
+        lowered=lowered,
+        keywords=frozenset(found),
+        words=len(lowered.split()),
+        emoji_only=emoji_only,
+    )
@@ -1,8 +1,19 @@
 # messaging_utils.py
 import asyncio
+import contextvars
 import random
-from typing import List, Optional
+import re
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
 from logger import log_event
+from conversation_history import record_message
+from inflight import claim_send, current_message_id
+from cascade import link_reply
+
+# Sentence end: terminal punctuation (plus closing quotes/brackets) followed
+# by whitespace, or a line break.
+_SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*\s+|\n+")
 
 
 def _split_into_chunks(text: str, max_len: int = 220) -> List[str]:
@@ -66,6 +77,83 @@ def _split_into_chunks(text: str, max_len: int = 220) -> List[str]:
     return [c.strip() for c in final_chunks if c.strip()]
 
 
+class SendOrder:
+    """
+    Keeps the sends of several siblings answering the same message in order
+    while their replies generate concurrently: each waits until everyone
+    before her has finished sending (or given up), then a short stagger.
+    Streamed replies open their stream straight away and buffer text until
+    their turn; the stream's scheduler slot is released as soon as the
+    provider is done, not when the buffered text is sent (see llm).
+    """
+
+    def __init__(self, names: Sequence[str], stagger_s: Tuple[float, float] = (1.5, 4.0), max_wait_s: float = 60.0):
+        self._order = list(names)
+        self._done = {name: asyncio.Event() for name in self._order}
+        self._sent = {name: False for name in self._order}
+        self.stagger_s = stagger_s
+        self.max_wait_s = max_wait_s
+
+    async def wait_turn(self, name: str):
+        earlier = self._order[:self._order.index(name)] if name in self._order else []
+        if not earlier:
+            return
+        deadline = time.monotonic() + self.max_wait_s
+        for previous in earlier:
+            try:
+                await asyncio.wait_for(self._done[previous].wait(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                log_event(f"[SEND] {name} stopped waiting for {previous} after {self.max_wait_s:.0f}s")
+                return
+        if any(self._sent[previous] for previous in earlier):
+            await asyncio.sleep(random.uniform(*self.stagger_s))
+
+    def finish(self, name: str, sent: bool):
+        if name in self._done and not self._done[name].is_set():
+            self._sent[name] = sent
+            self._done[name].set()
+
+
+_send_turn: contextvars.ContextVar[Optional[Tuple[SendOrder, str]]] = contextvars.ContextVar(
+    "send_turn", default=None
+)
+
+
+@contextmanager
+def send_turn(order: SendOrder, name: str):
+    """Sends made inside this block wait for `name`'s turn in `order`."""
+    token = _send_turn.set((order, name))
+    try:
+        yield
+    finally:
+        # Never leave later siblings waiting on a handler that didn't send
+        order.finish(name, sent=False)
+        _send_turn.reset(token)
+
+
+async def _await_turn():
+    turn = _send_turn.get()
+    if turn is not None:
+        await turn[0].wait_turn(turn[1])
+
+
+def _end_turn(sent: bool):
+    turn = _send_turn.get()
+    if turn is not None:
+        turn[0].finish(turn[1], sent)
+
+
+def _remember_sent(channel, who: str, chunk: str, sent_message) -> None:
+    """Add an outgoing chunk to the channel's conversation history and reply thread."""
+    channel_id = getattr(channel, "id", None)
+    if channel_id is None:
+        return
+    sent_id = getattr(sent_message, "id", None)
+    record_message(channel_id, who, chunk, message_id=sent_id)
+    # A reply sits one level deeper in the thread of the message it answers
+    link_reply(current_message_id(), sent_id)
+
+
 async def send_human_like_message(
     channel,
     text: str,
@@ -74,16 +162,22 @@ async def send_human_like_message(
     base_typing_delay: float = 0.5,
     jitter: float = 0.8,
     multi_message_chance: float = 0.45,
-) -> None:
+) -> bool:
     """
     Send a message in a more human-like way:
       - optional multi-message split
       - typing indicator
       - length-based delay
+    Returns False (nothing sent) if the text is empty or the reply was
+    superseded by a newer message (see inflight).
     """
     text = text.strip()
     if not text:
-        return
+        return False
+    await _await_turn()
+    if not claim_send():
+        _end_turn(False)
+        return False
 
     chunks = _split_into_chunks(text)
 
@@ -91,18 +185,115 @@ async def send_human_like_message(
     if len(chunks) > 1 and random.random() > multi_message_chance:
         chunks = [" ".join(chunks)]
 
-    for idx, chunk in enumerate(chunks):
-        # Delay based on length + jitter
-        char_factor = min(5.0, 0.02 * len(chunk))
-        delay = base_typing_delay + char_factor + random.uniform(0, jitter)
+    try:
+        for idx, chunk in enumerate(chunks):
+            # Delay based on length + jitter
+            char_factor = min(5.0, 0.02 * len(chunk))
+            delay = base_typing_delay + char_factor + random.uniform(0, jitter)
 
-        async with channel.typing():
-            await asyncio.sleep(delay)
+            async with channel.typing():
+                await asyncio.sleep(delay)
 
-        await channel.send(chunk)
-        who = speaker_name or "Unknown"
+            sent = await channel.send(chunk)
+            who = speaker_name or "Unknown"
+            _remember_sent(channel, who, chunk, sent)
+            log_event(f"[HUMAN_SEND] {who}: {chunk}")
+
+            if idx < len(chunks) - 1:
+                # Small pause between multi-part messages
+                await asyncio.sleep(random.uniform(0.6, 2.2))
+    finally:
+        _end_turn(True)
+
+    return True
+
+
+def streaming_enabled(config: Dict) -> bool:
+    """True when replies should be streamed chunk-by-chunk into the channel."""
+    return bool((config.get("conversation") or {}).get("stream_replies"))
+
+
+def _take_ready_chunk(buf: str, min_len: int, max_len: int) -> Optional[int]:
+    """
+    Return the index where a complete, sendable chunk of `buf` ends, or None
+    if more text is needed. A chunk ends at the first sentence boundary past
+    `min_len`; an over-long run with no boundary is cut at the last space.
+    """
+    for m in _SENTENCE_END.finditer(buf):
+        if m.start() >= min_len or m.end() > max_len:
+            return m.end()
+    if len(buf) > max_len:
+        cut = buf.rfind(" ", 0, max_len)
+        return cut if cut > 0 else max_len
+    return None
+
+
+async def send_human_like_stream(
+    channel,
+    pieces: AsyncIterator[str],
+    *,
+    speaker_name: Optional[str] = None,
+    base_typing_delay: float = 0.5,
+    jitter: float = 0.8,
+    min_chunk_len: int = 40,
+    max_len: int = 220,
+) -> str:
+    """
+    Streaming counterpart of send_human_like_message: consumes text deltas
+    and sends each sentence-sized chunk as soon as it is complete.
+
+    Time spent waiting on generation counts towards the simulated typing
+    delay, so a chunk that took long enough to arrive is sent right away.
+    Inside a send_turn() the stream is opened at once and read while this
+    sibling waits; the first chunk waits for her turn before it is sent.
+    Returns the full text that was sent ("" if nothing arrived or the reply
+    was superseded before its first chunk).
+    """
+    who = speaker_name or "Unknown"
+    sent: List[str] = []
+    buf = ""
+    chunk_started = time.monotonic()
+
+    async def _flush(chunk: str) -> bool:
+        nonlocal chunk_started
+        chunk = chunk.strip()
+        if not chunk:
+            return True
+        if not sent:
+            waited_from = time.monotonic()
+            await _await_turn()
+            # Time spent waiting on the others' sends isn't typing time
+            chunk_started += time.monotonic() - waited_from
+            if not claim_send():
+                return False
+        char_factor = min(5.0, 0.02 * len(chunk))
+        target = base_typing_delay + char_factor + random.uniform(0, jitter)
+        remaining = target - (time.monotonic() - chunk_started)
+        if remaining > 0:
+            async with channel.typing():
+                await asyncio.sleep(remaining)
+        msg = await channel.send(chunk)
+        sent.append(chunk)
+        _remember_sent(channel, who, chunk, msg)
         log_event(f"[HUMAN_SEND] {who}: {chunk}")
+        chunk_started = time.monotonic()
+        return True
 
-        if idx < len(chunks) - 1:
-            # Small pause between multi-part messages
-            await asyncio.sleep(random.uniform(0.6, 2.2))
+    try:
+        async for piece in pieces:
+            buf += piece
+            while True:
+                end = _take_ready_chunk(buf, min_chunk_len, max_len)
+                if end is None:
+                    break
+                chunk, buf = buf[:end], buf[end:]
+                if not await _flush(chunk):
+                    return ""
+        await _flush(buf)
+    finally:
+        _end_turn(bool(sent))
+        # Release the generator (and its scheduler slot) if we stopped early
+        aclose = getattr(pieces, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    return " ".join(sent)
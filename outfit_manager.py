@@ -3,6 +3,7 @@ import random
 import datetime
 from logger import log_event
 from image_gen import text2im  # your internal image generator
+from message_features import OUTFIT_KEYWORDS, extract_features
 
 # ---------------- Season Detection ----------------
 def get_current_season() -> str:
@@ -20,10 +21,7 @@ def get_current_season() -> str:
 
 
 # ---------------- Outfit Triggers ----------------
-OUTFIT_KEYWORDS = [
-    "outfit", "clothes", "wearing", "dress", "hoodie", "skirt", "shirt", "jeans", "coat",
-    "jacket", "layer", "change", "cold", "hot", "warm", "style", "fashion", "comfy", "look"
-]
+# OUTFIT_KEYWORDS lives in message_features with the other keyword families
 
 # Who can generate outfit posts (Selene primary, others if mentioned)
 POST_PRIORITY = ["Selene", "Ivy", "Aria", "Cassandra"]
@@ -67,8 +65,7 @@ def build_outfit_prompt(name: str, mood: str, feeling_bold: bool = False) -> str
 # ---------------- Outfit Trigger Check ----------------
 def should_generate_outfit(message: str) -> bool:
     """Check if a message should trigger outfit generation."""
-    text = message.lower()
-    return any(word in text for word in OUTFIT_KEYWORDS)
+    return extract_features(message).wants_outfit
 
 
 # ---------------- Main Image Generator ----------------
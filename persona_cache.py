@@ -0,0 +1,90 @@
+# persona_cache.py
+# Shared in-process cache for persona data read from JSON on disk
+# (personality profiles, memory-derived summaries).
+#
+# Entries are keyed by (namespace, path) and validated against the file's
+# (mtime_ns, inode, size). Validation itself is throttled: within
+# REVALIDATE_S of the last check an entry is served without touching the
+# filesystem, so the hot reply path does no disk I/O for persona data.
+
+import os
+import json
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from logger import log_event
+
+REVALIDATE_S = float(os.getenv("PERSONA_CACHE_REVALIDATE_S", "30"))
+
+_entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_stats = {"hits": 0, "misses": 0, "revalidations": 0}
+
+
+def _signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log_event(f"[WARN] Persona cache read failed {path}: {e}")
+        return None
+
+
+def get_cached(
+    path: str,
+    build: Callable[[Optional[dict]], Any],
+    namespace: str = "json",
+) -> Any:
+    """
+    Return build(parsed_json) for `path`, re-reading the file only when its
+    signature changed. `build` receives None when the file is missing or
+    unreadable. The returned value is shared: treat it as read-only.
+    """
+    key = (namespace, path)
+    now = time.monotonic()
+    entry = _entries.get(key)
+
+    if entry is not None:
+        if now - entry["checked"] < REVALIDATE_S:
+            _stats["hits"] += 1
+            return entry["value"]
+        _stats["revalidations"] += 1
+        sig = _signature(path)
+        if sig == entry["sig"]:
+            entry["checked"] = now
+            _stats["hits"] += 1
+            return entry["value"]
+    else:
+        sig = _signature(path)
+
+    _stats["misses"] += 1
+    value = build(_read_json(path) if sig is not None else None)
+    _entries[key] = {"sig": sig, "checked": now, "value": value}
+    return value
+
+
+def invalidate(path: Optional[str] = None):
+    """Drop cached entries for one path (all namespaces), or everything."""
+    if path is None:
+        _entries.clear()
+        return
+    for key in [k for k in _entries if k[1] == path]:
+        del _entries[key]
+
+
+def get_persona_cache_stats() -> Dict:
+    total = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "entries": len(_entries),
+        "hit_rate": round(_stats["hits"] / total, 3) if total else None,
+    }
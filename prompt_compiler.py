@@ -0,0 +1,140 @@
+# prompt_compiler.py
+# Compiles each persona's static system prompt once and keeps it
+# byte-identical between calls, so provider-side prompt caching can reuse
+# it. Everything that changes per call (theme, role, history, length hint,
+# addressee) goes into a separate suffix placed after the static prefix.
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# ---------------------------------------------------------------------------
+# Token counting (tiktoken is optional; fall back to a ~4 chars/token guess)
+# ---------------------------------------------------------------------------
+_encoder = None
+_encoder_loaded = False
+
+def count_tokens(text: str) -> int:
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = None
+    if _encoder is not None:
+        return len(_encoder.encode(text))
+    return max(1, len(text) // 4) if text else 0
+
+# ---------------------------------------------------------------------------
+# Templates
+# ---------------------------------------------------------------------------
+PREFIX_TEMPLATE = """You are {sister}, part of a family group chat.
+Your replies must always reflect your unique personality.
+
+Personality profile:
+{summary}
+
+Roles you may be given:
+- Lead → write 2–4 guiding sentences
+- Support → 1–2 playful/supportive sentences
+- Rest → very short remark
+- DM → intimate, natural
+- Autonomous → casual chat about leisure or beliefs
+
+Special bias for {sister}: {bias}
+
+Instructions:
+- DO NOT prefix your replies with your own name.
+- Stay in character — {sister}’s quirks, tone, and identity must always show.
+- Avoid generic motivational platitudes unless they directly fit {sister}'s character.
+- Be reactive to the conversation and reference history naturally.
+"""
+
+VOICE_TEMPLATE = """
+Voice:
+{voice}
+"""
+
+
+@dataclass
+class CompiledPrompt:
+    sister: str
+    prefix: str
+    prefix_tokens: int
+    inputs: Tuple[str, str, str]
+
+
+# Latest prefix per (sister, voiced): behaviors pass their voice, DMs/autonomy
+# do not. The voice text is an input, so a changed voice replaces the entry
+# instead of adding one.
+_compiled: Dict[Tuple[str, bool], CompiledPrompt] = {}
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def compile_persona_prefix(
+    sister: str,
+    summary: str,
+    bias: str,
+    voice: Optional[str] = None,
+) -> CompiledPrompt:
+    """
+    Return the static prefix for `sister`, compiling it only when one of its
+    inputs changed (e.g. the personality file was edited).
+    """
+    key = (sister, bool(voice))
+    inputs = (summary, bias, voice or "")
+    cached = _compiled.get(key)
+    if cached is not None and cached.inputs == inputs:
+        return cached
+
+    prefix = PREFIX_TEMPLATE.format(sister=sister, summary=summary, bias=bias)
+    if voice:
+        prefix += VOICE_TEMPLATE.format(voice=voice)
+    compiled = CompiledPrompt(
+        sister=sister,
+        prefix=prefix,
+        prefix_tokens=count_tokens(prefix),
+        inputs=inputs,
+    )
+    _compiled[key] = compiled
+    st = _stats.setdefault(sister, {"compiles": 0, "calls": 0, "suffix_tokens_total": 0})
+    st["compiles"] += 1
+    return compiled
+
+
+def build_suffix(theme, role, history=None, summary=None) -> str:
+    """Volatile per-call context, appended after the static prefix."""
+    lines = [f"Theme for today: {theme}", f"Current role: {role}"]
+    if summary:
+        lines.append(f"\nEarlier in this conversation: {summary}")
+    if history:
+        lines.append("\nRecent conversation:")
+        lines.extend(f"{author}: {msg}" for author, msg in history)
+    return "\n".join(lines)
+
+
+def assemble_messages(compiled: CompiledPrompt, suffix: str, user_message: str) -> List[Dict]:
+    """Static prefix first, then the volatile suffix, then the instruction."""
+    st = _stats.setdefault(compiled.sister, {"compiles": 0, "calls": 0, "suffix_tokens_total": 0})
+    st["calls"] += 1
+    st["suffix_tokens_total"] += count_tokens(suffix) + count_tokens(user_message)
+    return [
+        {"role": "system", "content": compiled.prefix},
+        {"role": "system", "content": suffix},
+        {"role": "user", "content": user_message},
+    ]
+
+
+def get_prompt_stats() -> Dict:
+    out = {}
+    for sister, st in _stats.items():
+        prefixes = [c.prefix_tokens for (name, _), c in _compiled.items() if name == sister]
+        calls = st["calls"]
+        out[sister] = {
+            "prefix_tokens": max(prefixes) if prefixes else None,
+            "compiles": st["compiles"],
+            "calls": calls,
+            "avg_suffix_tokens": round(st["suffix_tokens_total"] / calls, 1) if calls else None,
+        }
+    return out
@@ -0,0 +1,116 @@
+# rate_limiter.py
+# Per-persona, per-channel reply rate limits as token buckets.
+#
+# Each persona's bucket refills at her config "rotation" entry's
+# cooldown_msgs_per_hour and holds up to `burst` tokens (entry "burst",
+# default RATE_BURST); replies are also spaced at least RATE_MIN_GAP_S
+# apart. Buckets live in memory only, in least-recently-used order, and a
+# bucket idle long enough to be full again is dropped (a fresh bucket is
+# identical), so nothing grows without bound or lands in the persisted state.
+# A token taken for a reply that never gets sent is refunded.
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from logger import log_event
+
+RATE_DEFAULT_PER_HOUR = float(os.getenv("RATE_DEFAULT_PER_HOUR", "4"))
+RATE_BURST = float(os.getenv("RATE_BURST", "2"))
+RATE_MIN_GAP_S = float(os.getenv("RATE_MIN_GAP_S", "110"))
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "last_taken", "previous_taken")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+        self.last_taken = float("-inf")
+        self.previous_taken = float("-inf")
+
+
+# persona -> (refill tokens/s, capacity)
+_limits: Dict[str, Tuple[float, float]] = {}
+_buckets: "OrderedDict[Tuple[str, int], TokenBucket]" = OrderedDict()
+_stats = {"allowed": 0, "limited": 0, "refunded": 0, "evicted": 0}
+
+
+def configure_rate_limits(config: Dict):
+    """Build per-persona limits from the config "rotation" entries."""
+    _limits.clear()
+    for entry in config.get("rotation") or []:
+        per_hour = float(entry.get("cooldown_msgs_per_hour") or RATE_DEFAULT_PER_HOUR)
+        _limits[entry["name"]] = (per_hour / 3600.0, max(1.0, float(entry.get("burst", RATE_BURST))))
+    _buckets.clear()
+    log_event("[RATE] " + ", ".join(f"{n} {r * 3600:g}/h" for n, (r, _) in _limits.items()))
+
+
+def _limit(persona: str) -> Tuple[float, float]:
+    return _limits.get(persona) or (RATE_DEFAULT_PER_HOUR / 3600.0, RATE_BURST)
+
+
+def _evict_idle(now: float):
+    """Drop least-recently-used buckets that have refilled completely."""
+    while _buckets:
+        (persona, _), bucket = next(iter(_buckets.items()))
+        rate, capacity = _limit(persona)
+        full_at = bucket.updated + (capacity - bucket.tokens) / rate if rate > 0 else float("inf")
+        if max(full_at, bucket.last_taken + RATE_MIN_GAP_S) > now:
+            break
+        _buckets.popitem(last=False)
+        _stats["evicted"] += 1
+
+
+def _bucket(persona: str, channel_id: int, now: float) -> TokenBucket:
+    _evict_idle(now)
+    key = (persona, int(channel_id))
+    rate, capacity = _limit(persona)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = TokenBucket(capacity, now)
+        _buckets[key] = bucket
+    else:
+        bucket.tokens = min(capacity, bucket.tokens + (now - bucket.updated) * rate)
+        bucket.updated = now
+        _buckets.move_to_end(key)
+    return bucket
+
+
+def take_token(persona: str, channel_id: int) -> bool:
+    """Consume a reply from `persona`'s budget in `channel_id`; False if none left."""
+    now = time.monotonic()
+    bucket = _bucket(persona, channel_id, now)
+    if bucket.tokens < 1.0 or now - bucket.last_taken < RATE_MIN_GAP_S:
+        _stats["limited"] += 1
+        return False
+    bucket.tokens -= 1.0
+    bucket.previous_taken, bucket.last_taken = bucket.last_taken, now
+    _stats["allowed"] += 1
+    return True
+
+
+def refund_token(persona: str, channel_id: int):
+    """Give back the token from take_token() when the reply wasn't sent after all."""
+    bucket = _buckets.get((persona, int(channel_id)))
+    if bucket is None:
+        return
+    _, capacity = _limit(persona)
+    bucket.tokens = min(capacity, bucket.tokens + 1.0)
+    bucket.last_taken = bucket.previous_taken
+    _stats["refunded"] += 1
+
+
+def drop_legacy_cooldowns(state: Dict):
+    """Remove the cooldown timestamps older versions kept in the persisted state."""
+    state.pop("cooldowns", None)
+    (state.get("routing") or {}).pop("cooldowns", None)
+
+
+def get_rate_limit_stats() -> Dict:
+    return {
+        **_stats,
+        "buckets": len(_buckets),
+        "limits_per_hour": {name: round(rate * 3600, 2) for name, (rate, _) in _limits.items()},
+    }
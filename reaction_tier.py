@@ -0,0 +1,118 @@
+# reaction_tier.py
+# The cheap reply tier: an emoji reaction or a short templated acknowledgement
+# instead of a full LLM reply, for messages with nothing to answer (emoji,
+# "lol", sibling chatter; see routing_utils.reply_tier). Costs no LLM call,
+# no reply-rate token and no cascade budget, so the channel still feels alive
+# while generations are saved for messages that deserve them. Because it
+# skips those gates, an ack ends its cascade thread: it is linked at
+# max_depth, so no sibling replies or reacts to it.
+#
+# Each persona reacts with her personality-file "symbol" or one of a few
+# emoji that fit her; acks are picked from per-persona templates. A reaction
+# that Discord rejects (e.g. no permission) falls back to an ack.
+
+import os
+import random
+import asyncio
+from typing import Dict, List, Optional
+
+from logger import log_event
+from persona_cache import get_cached
+from conversation_history import record_message
+from cascade import link_reply
+
+PERSONALITY_DIR = "Autonomy/Personalities"
+
+ACK_CHANCE = 0.25
+MIRROR_CHANCE = 0.3
+REACT_DELAY_S = (1.0, 6.0)
+
+REACTION_EMOJI: Dict[str, List[str]] = {
+    "Aria": ["🙂", "👍", "💛", "📖"],
+    "Selene": ["🤍", "🥰", "☺️", "✨"],
+    "Cassandra": ["👍", "💪", "✅", "👏"],
+    "Ivy": ["😂", "😏", "💅", "🙄"],
+    "Will": ["😅", "👀", "✨", "😂"],
+}
+
+ACK_TEMPLATES: Dict[str, List[str]] = {
+    "Aria": ["mm, fair", "that's nice {symbol}", "noted 🙂", "haha, true"],
+    "Selene": ["aw {symbol}", "love that 🤍", "good, good", "sweet"],
+    "Cassandra": ["Good.", "Noted.", "Fair enough.", "Approved {symbol}"],
+    "Ivy": ["lmao", "ok ok", "sure sure 😏", "iconic {symbol}"],
+    "Will": ["haha yeah", "same tbh", "lol", "nice {symbol}"],
+}
+DEFAULT_EMOJI = ["👍", "🙂", "❤️"]
+DEFAULT_ACKS = ["haha", "nice", "true"]
+
+_stats = {"reactions": 0, "acks": 0, "failed": 0}
+
+
+def persona_symbol(name: str) -> str:
+    """The persona's "symbol" emoji from her personality file ("" if none)."""
+    path = os.path.join(PERSONALITY_DIR, f"{name}_Personality.json")
+    return get_cached(path, lambda data: str((data or {}).get("symbol") or ""), namespace="symbol")
+
+
+def pick_reaction(name: str, content: str = "", emoji_only: bool = False) -> str:
+    """An emoji for `name` to react with; sometimes mirrors an emoji-only message."""
+    if emoji_only and random.random() < MIRROR_CHANCE:
+        mirrored = next((c for c in content if ord(c) > 0x2000 and not c.isspace()), None)
+        if mirrored:
+            return mirrored
+    symbol = persona_symbol(name)
+    choices = list(REACTION_EMOJI.get(name, DEFAULT_EMOJI)) + ([symbol] if symbol else [])
+    return random.choice(choices)
+
+
+def pick_ack(name: str) -> str:
+    """A short acknowledgement in `name`'s voice."""
+    template = random.choice(ACK_TEMPLATES.get(name, DEFAULT_ACKS))
+    return template.format(symbol=persona_symbol(name) or "🙂").strip()
+
+
+async def react_to_message(
+    bot,
+    channel_id: int,
+    message_id: int,
+    *,
+    content: str = "",
+    emoji_only: bool = False,
+) -> Optional[str]:
+    """
+    React to message `message_id` as `bot`'s persona, after a short human
+    delay. Returns "reaction", "ack" or None if nothing could be sent.
+    """
+    name = bot.sister_info["name"]
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        return None
+    await asyncio.sleep(random.uniform(*REACT_DELAY_S))
+
+    if random.random() >= ACK_CHANCE and hasattr(channel, "get_partial_message"):
+        emoji = pick_reaction(name, content, emoji_only)
+        try:
+            await channel.get_partial_message(message_id).add_reaction(emoji)
+            _stats["reactions"] += 1
+            log_event(f"[REACT] {name} reacted {emoji} to {message_id}")
+            return "reaction"
+        except Exception as e:
+            log_event(f"[WARN] {name} reaction failed, sending an ack instead: {e}")
+
+    ack = pick_ack(name)
+    try:
+        sent = await channel.send(ack)
+    except Exception as e:
+        _stats["failed"] += 1
+        log_event(f"[ERROR] {name} ack failed: {e}")
+        return None
+    sent_id = getattr(sent, "id", None)
+    record_message(channel_id, name, ack, message_id=sent_id)
+    link_reply(message_id, sent_id, terminal=True)
+    _stats["acks"] += 1
+    log_event(f"[REACT] {name} acked {message_id}: {ack}")
+    return "ack"
+
+
+def get_reaction_stats() -> Dict:
+    return {**_stats, "llm_calls_saved": _stats["reactions"] + _stats["acks"]}
@@ -0,0 +1,387 @@
+# replay_bench.py
+# End-to-end replay benchmark: feeds a recorded or synthetic stream of
+# family-channel messages through main.on_family_message with stub bots and
+# channels, answering every LLM call from the deterministic "fake" backend
+# (fake_llm). Prints a JSON report with throughput, reply latency
+# percentiles and per-stage timings.
+#
+#   python replay_bench.py --messages 200 --rate 2
+#   python replay_bench.py --input data/recorded.jsonl --speed 10
+#   python replay_bench.py --latency '{"dist": "uniform", "min_ms": 200, "max_ms": 900}'
+#
+# A recorded stream is JSONL, one message per line:
+#   {"t": 12.5, "author": "Sam", "content": "anyone up?"}
+# where t is seconds from the start, and an author that is a sibling name
+# is sent as that sibling's bot.
+#
+# Messages enter through main.receive_family_message (dedup + event bus),
+# as they would from the gateway. Everything runs in real time (typing
+# delays included), against a copy of config.json with everyone awake;
+# state, summaries, the usage ledger, shared memories and the log go to a
+# temp dir. Sibling replies are echoed back into the channel, so
+# sibling-to-sibling chatter is part of the load.
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+from typing import Dict, List
+
+SIBLINGS = ["Aria", "Selene", "Cassandra", "Ivy", "Will"]
+HUMANS = ["Sam", "Jess", "Alex"]
+SYNTHETIC_LINES = [
+    "anyone up?",
+    "how was everyone's day",
+    "{name}, did you finish that thing you were working on?",
+    "what's for dinner tonight",
+    "I'm so tired lol",
+    "{name} are you coming this weekend?",
+    "just got back from the gym",
+    "can someone remind me what time we're meeting tomorrow",
+    "that movie last night was wild",
+    "good morning everyone",
+    "lol",
+    "😂😂",
+    "ok nice",
+]
+BOT_ID_BASE = 900_000_000_000_000_000
+HUMAN_ID_BASE = 800_000_000_000_000_000
+
+
+def _percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def _at(q):
+        return round(1000 * ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+    return {"count": len(ordered), "p50_ms": _at(0.5), "p90_ms": _at(0.9), "p99_ms": _at(0.99),
+            "max_ms": round(1000 * ordered[-1], 1)}
+
+
+def prepare_environment(args) -> Dict:
+    """Write the bench config + temp paths; must run before main is imported."""
+    workdir = tempfile.mkdtemp(prefix="replay_bench_")
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    config["llm_backends"] = [{
+        "name": "fake",
+        "type": "fake",
+        "model": "fake-model",
+        "latency": json.loads(args.latency),
+        "seed": args.seed,
+    }]
+    config["llm_routing"] = {"default": ["fake"]}
+    config["schedules"] = {name: {"wake": [0, 0], "sleep": [24, 24]} for name in SIBLINGS}
+
+    config_path = os.path.join(workdir, "config.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+    os.environ["CONFIG_PATH"] = config_path
+    os.environ["STATE_FILE"] = os.path.join(workdir, "state.json")
+    os.environ["SUMMARY_FILE"] = os.path.join(workdir, "conversation_summaries.json")
+    os.environ["USAGE_LEDGER_FILE"] = os.path.join(workdir, "usage_ledger.jsonl")
+    os.environ["SHARED_CONTEXT_DIR"] = os.path.join(workdir, "shared")
+    os.environ["LOG_DIR"] = os.path.join(workdir, "logs")
+    # Module-level OpenAI clients (image_utils) refuse to build without a key;
+    # nothing in the bench calls the real API.
+    os.environ.setdefault("OPENAI_API_KEY", "replay-bench")
+    return config
+
+
+class StubUser:
+    def __init__(self, user_id: int, name: str, bot: bool):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+
+    def __eq__(self, other):
+        return isinstance(other, StubUser) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class StubMessage:
+    def __init__(self, message_id: int, content: str, author: StubUser, channel):
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.mentions = []
+        self.reference = None
+
+
+class _Typing:
+    def __init__(self, bench: "ReplayBench"):
+        self._bench = bench
+
+    async def __aenter__(self):
+        self._started = time.perf_counter()
+
+    async def __aexit__(self, *exc):
+        self._bench.stages["typing"].append(time.perf_counter() - self._started)
+
+
+class _StubPartialMessage:
+    def __init__(self, message_id: int, bench: "ReplayBench"):
+        self.id = message_id
+        self._bench = bench
+
+    async def add_reaction(self, emoji: str):
+        self._bench.reactions += 1
+
+
+class StubChannel:
+    """One sibling's view of the family channel."""
+
+    def __init__(self, channel_id: int, bench: "ReplayBench", user: StubUser):
+        self.id = channel_id
+        self._bench = bench
+        self._user = user
+
+    def typing(self):
+        return _Typing(self._bench)
+
+    async def send(self, content: str) -> StubMessage:
+        return self._bench.on_send(self, self._user, content)
+
+    def get_partial_message(self, message_id: int) -> _StubPartialMessage:
+        return _StubPartialMessage(message_id, self._bench)
+
+
+class StubBot:
+    def __init__(self, name: str, index: int, bench: "ReplayBench"):
+        self.sister_info = {"name": name, "env_var": f"{name.upper()}_TOKEN"}
+        self.user = StubUser(BOT_ID_BASE + index, name, bot=True)
+        self._bench = bench
+        self._channels: Dict[int, StubChannel] = {}
+
+    def is_ready(self) -> bool:
+        return True
+
+    def get_channel(self, channel_id: int) -> StubChannel:
+        channel = self._channels.get(int(channel_id))
+        if channel is None:
+            channel = StubChannel(int(channel_id), self._bench, self.user)
+            self._channels[int(channel_id)] = channel
+        return channel
+
+
+class ReplayBench:
+    def __init__(self, main_module, args):
+        self.main = main_module
+        self.args = args
+        self.channel_id = int(main_module.config["family_group_channel"])
+        self.bots = [StubBot(name, i, self) for i, name in enumerate(SIBLINGS)]
+        self.humans = {name: StubUser(HUMAN_ID_BASE + i, name, bot=False) for i, name in enumerate(HUMANS)}
+        self._next_id = 1_000_000
+        self.injected_at: Dict[int, float] = {}
+        self.replied: set = set()
+        self.reply_latency: List[float] = []
+        self.sends = 0
+        self.reactions = 0
+        self.echoes = 0
+        self.stages: Dict[str, List[float]] = defaultdict(list)
+        self.tasks: set = set()
+
+    # -- message plumbing ---------------------------------------------------
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def on_send(self, channel: StubChannel, author: StubUser, content: str) -> StubMessage:
+        from inflight import current_message_id
+
+        now = time.perf_counter()
+        self.sends += 1
+        trigger = current_message_id()
+        if trigger in self.injected_at and (author.name, trigger) not in self.replied:
+            self.replied.add((author.name, trigger))
+            self.reply_latency.append(now - self.injected_at[trigger])
+
+        sent = StubMessage(self._new_id(), content, author, channel)
+        if self.args.echo:
+            self.echoes += 1
+            self._spawn(self.deliver(sent))
+        return sent
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def deliver(self, message: StubMessage):
+        """Every other bot's on_message fires for the same gateway event."""
+        for bot in self.bots:
+            if bot.user != message.author:
+                self.main.receive_family_message(message)
+
+    async def _dispatch(self, message: StubMessage):
+        started = time.perf_counter()
+        try:
+            await self.main.on_family_message(message)
+        finally:
+            self.stages["on_family_message"].append(time.perf_counter() - started)
+
+    def inject(self, author: str, content: str):
+        bot = next((b for b in self.bots if b.sister_info["name"].lower() == author.lower()), None)
+        if bot is not None:
+            user, channel = bot.user, bot.get_channel(self.channel_id)
+        else:
+            user = self.humans.get(author) or StubUser(HUMAN_ID_BASE + len(self.humans), author, bot=False)
+            self.humans[author] = user
+            channel = self.bots[0].get_channel(self.channel_id)
+        message = StubMessage(self._new_id(), content, user, channel)
+        self.injected_at[message.id] = time.perf_counter()
+        self._spawn(self.deliver(message))
+
+    # -- instrumentation ----------------------------------------------------
+    def instrument(self):
+        """Swap in the stub bots and time each behavior handler."""
+        self.main.sisters[:] = self.bots
+        self.main.state.setdefault("routing", {}).pop("sister_id_map", None)
+
+        def _timed(fn):
+            async def wrapper(**kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(**kwargs)
+                finally:
+                    self.stages["handler"].append(time.perf_counter() - started)
+            return wrapper
+
+        for name, fn in list(self.main.BEHAVIOR_HANDLERS.items()):
+            self.main.BEHAVIOR_HANDLERS[name] = _timed(fn)
+
+    # -- input streams ------------------------------------------------------
+    def synthetic_stream(self) -> List[Dict]:
+        rng = random.Random(self.args.seed)
+        t, out = 0.0, []
+        for _ in range(self.args.messages):
+            t += rng.expovariate(self.args.rate)
+            line = rng.choice(SYNTHETIC_LINES).format(name=rng.choice(SIBLINGS))
+            out.append({"t": t, "author": rng.choice(HUMANS), "content": line})
+        return out
+
+    def recorded_stream(self, path: str) -> List[Dict]:
+        out = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    out.append(json.loads(line))
+        return sorted(out, key=lambda m: float(m.get("t", 0)))
+
+    async def run(self) -> Dict:
+        from event_bus import start_event_bus, stop_event_bus, wait_idle
+
+        stream = self.recorded_stream(self.args.input) if self.args.input else self.synthetic_stream()
+        self.instrument()
+        start_event_bus(self._dispatch)
+
+        started = time.perf_counter()
+        for item in stream:
+            due = started + float(item.get("t", 0)) / self.args.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.inject(str(item.get("author", "Sam")), str(item.get("content", "")))
+        injected = time.perf_counter() - started
+
+        drain_until = time.perf_counter() + self.args.drain_s
+        while time.perf_counter() < drain_until:
+            if self.tasks:
+                await asyncio.wait(set(self.tasks), timeout=max(0.0, drain_until - time.perf_counter()))
+                continue
+            try:
+                await asyncio.wait_for(wait_idle(), max(0.0, drain_until - time.perf_counter()))
+            except asyncio.TimeoutError:
+                break
+            if not self.tasks:
+                break
+        elapsed = time.perf_counter() - started
+        for task in list(self.tasks):
+            task.cancel()
+        await stop_event_bus()
+
+        return self.report(len(stream), injected, elapsed)
+
+    def report(self, inputs: int, injected_s: float, elapsed_s: float) -> Dict:
+        from llm import get_llm_latency_stats
+        from llm_backends import get_backend_stats
+        from llm_scheduler import get_scheduler_stats
+        from inflight import get_inflight_stats
+        from usage_ledger import get_usage
+        from event_bus import get_event_bus_stats
+        from cascade import get_cascade_stats
+        from reaction_tier import get_reaction_stats
+
+        dispatches = len(self.stages["on_family_message"])
+        return {
+            "inputs": inputs,
+            "dispatches": dispatches,
+            "replies": len(self.reply_latency),
+            "sends": self.sends,
+            "reactions_added": self.reactions,
+            "unfinished_tasks": len(self.tasks),
+            "injected_s": round(injected_s, 2),
+            "elapsed_s": round(elapsed_s, 2),
+            "messages_per_s": round(inputs / elapsed_s, 2) if elapsed_s else None,
+            "dispatches_per_s": round(dispatches / elapsed_s, 2) if elapsed_s else None,
+            "reply_latency": _percentiles(self.reply_latency),
+            "stages": {name: _percentiles(values) for name, values in sorted(self.stages.items())},
+            "llm": get_llm_latency_stats(),
+            "llm_backends": get_backend_stats(),
+            "llm_scheduler": get_scheduler_stats(),
+            "inflight": get_inflight_stats(),
+            "event_bus": get_event_bus_stats(),
+            "cascade": get_cascade_stats(),
+            "reactions": get_reaction_stats(),
+            "usage": get_usage(group_by="call_site"),
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay messages through on_family_message against a fake LLM.")
+    parser.add_argument("--input", help="recorded JSONL stream (default: synthetic)")
+    parser.add_argument("--messages", type=int, default=100, help="synthetic message count")
+    parser.add_argument("--rate", type=float, default=1.0, help="synthetic messages per second")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up for recorded timestamps")
+    parser.add_argument("--latency", default='{"dist": "lognormal", "median_ms": 450, "sigma": 0.4}',
+                        help="fake backend latency config (JSON, see fake_llm)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--drain-s", type=float, default=120.0, help="max wait for in-flight replies at the end")
+    parser.add_argument("--no-echo", dest="echo", action="store_false",
+                        help="don't feed sibling replies back into the channel")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"))
+    return parser.parse_args(argv)
+
+
+async def _main(args) -> Dict:
+    import main as main_module
+    from llm import close_llm_client
+    from usage_ledger import flush_ledger
+
+    random.seed(args.seed)
+    main_module.load_state()
+    bench = ReplayBench(main_module, args)
+    try:
+        return await bench.run()
+    finally:
+        flush_ledger()
+        await close_llm_client()
+
+
+if __name__ == "__main__":
+    cli_args = parse_args()
+    prepare_environment(cli_args)
+    print(json.dumps(asyncio.run(_main(cli_args)), indent=2))
@@ -0,0 +1,130 @@
+# response_cache.py
+# LRU + TTL cache of LLM completions for prompts that repeat all day
+# (the chatter loops' base prompts).
+#
+# Keys are a hash of (persona, theme, normalized prompt). Each key collects
+# up to RESPONSE_CACHE_VARIANTS different completions before it starts
+# serving from cache. A variant is never served twice in a row, and it is
+# retired after RESPONSE_CACHE_MAX_SERVES cache hits or once its TTL expires,
+# so repeated prompts skip the network without repeating the same line.
+
+import os
+import re
+import time
+import random
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+RESPONSE_CACHE_MAX_KEYS = int(os.getenv("RESPONSE_CACHE_MAX_KEYS", "256"))
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", str(6 * 3600)))
+RESPONSE_CACHE_VARIANTS = int(os.getenv("RESPONSE_CACHE_VARIANTS", "3"))
+RESPONSE_CACHE_MAX_SERVES = int(os.getenv("RESPONSE_CACHE_MAX_SERVES", "2"))
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+@dataclass
+class _Variant:
+    text: str
+    created: float = field(default_factory=time.monotonic)
+    serves: int = 0
+
+
+@dataclass
+class _Entry:
+    variants: List[_Variant] = field(default_factory=list)
+    last_served: Optional[str] = None
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", (prompt or "").lower())).strip()
+
+
+def make_key(persona: str, theme, prompt: str) -> str:
+    raw = "\x1f".join([persona, str(theme or ""), normalize_prompt(prompt)])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_keys: int, ttl_s: float, variants: int, max_serves: int):
+        self.max_keys = max(1, max_keys)
+        self.ttl_s = ttl_s
+        self.variants = max(1, variants)
+        self.max_serves = max(1, max_serves)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        self._miss_latency_total = 0.0
+        self._miss_latency_calls = 0
+
+    def _live(self, entry: _Entry) -> List[_Variant]:
+        now = time.monotonic()
+        entry.variants = [
+            v for v in entry.variants
+            if now - v.created < self.ttl_s and v.serves < self.max_serves
+        ]
+        return entry.variants
+
+    def get(self, key: str) -> Optional[str]:
+        """A cached completion for `key`, or None if the caller should generate one."""
+        entry = self._entries.get(key)
+        if entry is None or len(self._live(entry)) < self.variants:
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        choices = [v for v in entry.variants if v.text != entry.last_served] or entry.variants
+        variant = random.choice(choices)
+        variant.serves += 1
+        entry.last_served = variant.text
+        self._stats["hits"] += 1
+        return variant.text
+
+    def put(self, key: str, text: str, latency_s: float):
+        """Store a fresh completion (already returned to its caller)."""
+        self._miss_latency_total += latency_s
+        self._miss_latency_calls += 1
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = _Entry()
+            self._entries[key] = entry
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+        self._entries.move_to_end(key)
+        live = self._live(entry)
+        if text in (v.text for v in live):
+            return
+        live.append(_Variant(text=text))
+        entry.last_served = text
+        if len(live) > self.variants:
+            live.pop(0)
+        self._stats["stored"] += 1
+
+    def stats(self) -> Dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        avg_miss = (
+            self._miss_latency_total / self._miss_latency_calls
+            if self._miss_latency_calls else None
+        )
+        return {
+            **self._stats,
+            "keys": len(self._entries),
+            "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else None,
+            "avg_miss_ms": round(1000 * avg_miss, 1) if avg_miss is not None else None,
+            "saved_ms_total": round(1000 * avg_miss * self._stats["hits"], 1) if avg_miss is not None else None,
+        }
+
+
+response_cache = ResponseCache(
+    RESPONSE_CACHE_MAX_KEYS,
+    RESPONSE_CACHE_TTL_S,
+    RESPONSE_CACHE_VARIANTS,
+    RESPONSE_CACHE_MAX_SERVES,
+)
+
+
+def get_response_cache_stats() -> Dict:
+    return response_cache.stats()
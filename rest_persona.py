@@ -0,0 +1,74 @@
+# rest_persona.py
+# REST-only persona clients for single-gateway mode.
+#
+# In single-gateway mode one bot (config "gateway.listener") holds the
+# gateway connection and dispatches every family-channel event; the other
+# personas only need to post, so they log in over REST (no websocket, no
+# intents, no message cache), each with a small aiohttp pool of its own.
+# The pools can't be shared: discord.py's HTTP session owns its connector
+# and closes it with the client.
+#
+# Off by default ("gateway": {"mode": "multi"}). To opt in, set
+#   "gateway": {"mode": "single", "listener": "Aria"}
+# in config.json; the listener's bot needs the message-content intent and
+# must be in every channel the family uses, since no other bot sees events.
+#
+# RestPersona duck-types the parts of commands.Bot the rest of the code
+# uses: sister_info, user, is_ready() and get_channel(), where the channel
+# is a PartialMessageable (send / typing over REST).
+
+import os
+import asyncio
+from typing import List, Optional
+
+import aiohttp
+import discord
+
+from logger import log_event
+
+# Connections per persona
+REST_POOL_LIMIT = int(os.getenv("REST_POOL_LIMIT", "5"))
+
+
+class RestPersona:
+    def __init__(self, name: str, env_var: str):
+        self.sister_info = {"name": name, "env_var": env_var}
+        self._client: Optional[discord.Client] = None
+        self._ready = False
+
+    @property
+    def user(self) -> Optional[discord.ClientUser]:
+        return self._client.user if self._client is not None else None
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def get_channel(self, channel_id: int) -> Optional[discord.PartialMessageable]:
+        if not self._ready:
+            return None
+        return self._client.get_partial_messageable(int(channel_id))
+
+    async def start(self, token: str):
+        """Log in over REST only; never opens a gateway connection."""
+        # Built here, inside the running loop; closed with the client
+        connector = aiohttp.TCPConnector(limit=REST_POOL_LIMIT)
+        self._client = discord.Client(intents=discord.Intents.none(), connector=connector)
+        try:
+            await self._client.login(token)
+        except Exception as e:
+            log_event(f"[ERROR] REST login failed for {self.sister_info['name']}: {e}")
+            return
+        self._ready = True
+        log_event(f"[ONLINE] {self.sister_info['name']} ready over REST as {self.user}")
+
+    async def close(self):
+        self._ready = False
+        if self._client is not None:
+            await self._client.close()
+
+
+async def close_rest_personas(personas: List):
+    await asyncio.gather(
+        *(p.close() for p in personas if isinstance(p, RestPersona)),
+        return_exceptions=True,
+    )
@@ -1,9 +1,16 @@
 # routing_utils.py
-from dataclasses import dataclass
-from typing import Optional, Dict
+import os
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Dict, List
 
 import discord  # type: ignore
 
+from load_shedder import scaled
+from message_features import MessageFeatures
+
 @dataclass
 class SenderInfo:
     discord_id: int
@@ -64,3 +71,183 @@ def resolve_author_label(sender: SenderInfo) -> str:
         return "you"
     # fallback: other bots / unknown
     return sender.display_name or "unknown"
+
+
+# ---------------------------------------------------------------------------
+# Family-channel routing helpers (used by main.on_family_message)
+# ---------------------------------------------------------------------------
+SISTER_ALIASES = {
+    "Aria": ["aria", "ari"],
+    "Selene": ["selene", "luna"],
+    "Cassandra": ["cassandra", "cass", "cassie"],
+    "Ivy": ["ivy", "vy"],
+    "Will": ["will", "willow"],
+}
+
+HUMAN_REPLY_CHANCE = 0.45
+SIBLING_REPLY_CHANCE = 0.2
+ADDRESSED_ELSEWHERE_CHANCE = 0.08
+# Sibling chatter not addressed to her gets a reaction instead of a reply this often
+SIBLING_REACT_CHANCE = 0.6
+
+
+@dataclass
+class MessageContext:
+    channel_id: int
+    message_id: int
+    content: str
+    sender: SenderInfo
+    author_label: str
+    sender_is_bot: bool
+    sender_sister: Optional[str]
+    sender_display: str
+    mentioned_sisters: List[str] = field(default_factory=list)
+    reply_to_sister: Optional[str] = None
+    reply_to_id: Optional[int] = None
+
+
+def build_sister_id_map(sisters) -> Dict[int, str]:
+    """Map each logged-in sister bot's Discord user ID to her name."""
+    out: Dict[int, str] = {}
+    for bot in sisters:
+        user = getattr(bot, "user", None)
+        if user is not None:
+            out[int(user.id)] = bot.sister_info["name"]
+    return out
+
+
+def _mentioned_sisters(message: discord.Message, content: str, sister_id_map: Dict[int, str]) -> List[str]:
+    found = []
+    for user in getattr(message, "mentions", None) or []:
+        name = sister_id_map.get(int(user.id))
+        if name and name not in found:
+            found.append(name)
+    words = set(
+        w.strip(".,!?:;\"'()*_~") for w in content.lower().split()
+    )
+    for name, aliases in SISTER_ALIASES.items():
+        if name not in found and any(a in words for a in aliases):
+            found.append(name)
+    return found
+
+
+def identify_sender(message: discord.Message, sister_id_map: Optional[Dict] = None) -> MessageContext:
+    """Build the routing context for one incoming family-channel message."""
+    # IDs may have round-tripped through the persisted JSON state as strings
+    id_map = {int(k): v for k, v in (sister_id_map or {}).items()}
+    sender = classify_sender(message, id_map)
+    content = message.content or ""
+
+    reply_to = None
+    ref = getattr(message, "reference", None)
+    reply_to_id = getattr(ref, "message_id", None) if ref else None
+    resolved = getattr(ref, "resolved", None) if ref else None
+    if resolved is not None and getattr(resolved, "author", None) is not None:
+        reply_to = id_map.get(int(resolved.author.id))
+
+    return MessageContext(
+        channel_id=int(message.channel.id),
+        message_id=int(message.id),
+        content=content,
+        sender=sender,
+        author_label=resolve_author_label(sender),
+        sender_is_bot=sender.is_bot,
+        sender_sister=sender.sister_name,
+        sender_display=sender.display_name,
+        mentioned_sisters=_mentioned_sisters(message, content, id_map),
+        reply_to_sister=reply_to,
+        reply_to_id=int(reply_to_id) if reply_to_id is not None else None,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Gateway event dedup (every bot receives the same family-channel message)
+# ---------------------------------------------------------------------------
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "4096"))
+
+
+class TTLDedup:
+    """
+    In-memory "seen" set with per-key expiry and a hard size cap.
+    Keys sit in insertion order, so expired entries are swept from the
+    front and the oldest entry is dropped when the cap is hit; each
+    check_and_set() is amortised O(1). Nothing is persisted.
+    """
+
+    def __init__(self, max_entries: int = DEDUP_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._expires: "OrderedDict[int, float]" = OrderedDict()
+        self.stats = {"checks": 0, "duplicates": 0, "expired": 0, "evicted": 0}
+
+    def _sweep(self, now: float):
+        while self._expires:
+            key, expires_at = next(iter(self._expires.items()))
+            if expires_at > now:
+                break
+            del self._expires[key]
+            self.stats["expired"] += 1
+
+    def check_and_set(self, key: int, ttl_seconds: float) -> bool:
+        """True the first time `key` is seen within `ttl_seconds`, else False."""
+        now = time.monotonic()
+        self.stats["checks"] += 1
+        self._sweep(now)
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at > now:
+            self.stats["duplicates"] += 1
+            return False
+        self._expires.pop(key, None)
+        self._expires[key] = now + ttl_seconds
+        if len(self._expires) > self.max_entries:
+            self._expires.popitem(last=False)
+            self.stats["evicted"] += 1
+        return True
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+
+_message_dedup = TTLDedup()
+
+
+def should_process_message_once(message_id: int, ttl_seconds: float = 90) -> bool:
+    """Claim a gateway message ID; only the first bot to see it gets True."""
+    return _message_dedup.check_and_set(int(message_id), ttl_seconds)
+
+
+def get_dedup_stats() -> Dict:
+    return {**_message_dedup.stats, "size": len(_message_dedup), "max_entries": _message_dedup.max_entries}
+
+
+def should_reply(state: Dict, sister_name: str, ctx: MessageContext) -> bool:
+    """
+    Probability gate: always answer when addressed directly or replied to,
+    rarely when someone else was addressed, otherwise a base chance that is
+    lower for sibling chatter than for humans.
+    """
+    if sister_name in ctx.mentioned_sisters or ctx.reply_to_sister == sister_name:
+        return True
+    if ctx.mentioned_sisters or ctx.reply_to_sister:
+        return random.random() < ADDRESSED_ELSEWHERE_CHANCE
+    if ctx.sender_sister:
+        # Sibling chatter backs off while the LLM pipeline is under pressure
+        return random.random() < scaled(SIBLING_REPLY_CHANCE, "sibling_reply")
+    return random.random() < HUMAN_REPLY_CHANCE
+
+
+def reply_tier(sister_name: str, ctx: MessageContext, features: MessageFeatures) -> str:
+    """
+    For a sister who passed should_reply(): "reply" for a full LLM reply, or
+    "react" for the cheap tier (emoji reaction / templated ack, no LLM).
+    Emoji-only messages always get a reaction; one- or two-word remarks and
+    most sibling chatter do too unless they were addressed to her.
+    """
+    if features.emoji_only:
+        return "react"
+    if sister_name in ctx.mentioned_sisters or ctx.reply_to_sister == sister_name:
+        return "reply"
+    if features.low_signal:
+        return "react"
+    if ctx.sender_sister and random.random() < SIBLING_REACT_CHANCE:
+        return "react"
+    return "reply"
@@ -0,0 +1,142 @@
+# schedule_service.py
+# One source of truth for when each persona is awake.
+#
+# Once per AEDT day every persona gets a wake and a sleep hour, picked at
+# random inside her config "schedules" spans, turned into a 24-bit bitmap
+# (bit h set = online during hour h). is_online() is then a bit lookup
+# against the current AEDT hour, which is itself recomputed only when the
+# hour rolls over. Tomorrow's bitmap is built alongside today's so
+# next_transition() can see past midnight.
+
+import time
+import random
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+from logger import log_event
+
+AEDT = pytz.timezone("Australia/Sydney")
+
+DEFAULT_SCHEDULES: Dict[str, Dict[str, List[int]]] = {
+    "Aria": {"wake": [6, 8], "sleep": [22, 23]},
+    "Selene": {"wake": [7, 9], "sleep": [22, 24]},
+    "Cassandra": {"wake": [5, 7], "sleep": [21, 23]},
+    "Ivy": {"wake": [8, 10], "sleep": [23, 1]},
+    "Will": {"wake": [10, 12], "sleep": [0, 2]},
+}
+FALLBACK_SCHEDULE = {"wake": [6, 8], "sleep": [22, 23]}
+
+_spans: Dict[str, Dict[str, List[int]]] = dict(DEFAULT_SCHEDULES)
+# AEDT date -> persona -> (wake, sleep, bitmap)
+_days: Dict[date, Dict[str, Tuple[int, int, int]]] = {}
+# Current AEDT hour, cached until the next hour boundary
+_now_day: Optional[date] = None
+_now_hour = 0
+_hour_ends_at = 0.0
+_stats = {"checks": 0, "hour_refreshes": 0, "days_built": 0}
+
+
+def configure_schedules(config: Dict):
+    """Load wake/sleep hour spans from config "schedules"; resets the picks."""
+    global _spans, _hour_ends_at
+    _spans = {**DEFAULT_SCHEDULES, **(config.get("schedules") or {})}
+    _days.clear()
+    _hour_ends_at = 0.0
+
+
+def _pick_hour(span: List[int]) -> int:
+    """A random hour in [lo, hi]; a span like [23, 1] wraps past midnight."""
+    lo, hi = int(span[0]), int(span[1])
+    hours = list(range(lo, hi + 1)) if lo <= hi else list(range(lo, 24)) + list(range(0, hi + 1))
+    return random.choice(hours) % 24
+
+
+def _bitmap(wake: int, sleep: int) -> int:
+    if wake == sleep:
+        return (1 << 24) - 1
+    bits = 0
+    for h in range(24):
+        if (wake <= h < sleep) if wake < sleep else (h >= wake or h < sleep):
+            bits |= 1 << h
+    return bits
+
+
+def _day(day: date) -> Dict[str, Tuple[int, int, int]]:
+    built = _days.get(day)
+    if built is None:
+        built = {}
+        for name, span in _spans.items():
+            wake = _pick_hour(span.get("wake", FALLBACK_SCHEDULE["wake"]))
+            sleep = _pick_hour(span.get("sleep", FALLBACK_SCHEDULE["sleep"]))
+            built[name] = (wake, sleep, _bitmap(wake, sleep))
+        _days[day] = built
+        _stats["days_built"] += 1
+        for old in [d for d in _days if d < day - timedelta(days=1)]:
+            del _days[old]
+        log_event(f"[SCHEDULE] {day}: " + ", ".join(f"{n} {w}-{s}" for n, (w, s, _) in built.items()))
+    return built
+
+
+def _entry(name: str, day: date) -> Tuple[int, int, int]:
+    built = _day(day)
+    if name not in built:
+        wake = _pick_hour(FALLBACK_SCHEDULE["wake"])
+        sleep = _pick_hour(FALLBACK_SCHEDULE["sleep"])
+        built[name] = (wake, sleep, _bitmap(wake, sleep))
+    return built[name]
+
+
+def _refresh_hour():
+    global _now_day, _now_hour, _hour_ends_at
+    now = time.time()
+    if now < _hour_ends_at:
+        return
+    local = datetime.now(AEDT)
+    _now_day, _now_hour = local.date(), local.hour
+    _hour_ends_at = now + (60 - local.minute) * 60 - local.second - local.microsecond / 1e6
+    _stats["hour_refreshes"] += 1
+
+
+def is_online(name: str) -> bool:
+    """Whether `name` is awake right now (AEDT)."""
+    _stats["checks"] += 1
+    _refresh_hour()
+    return bool(_entry(name, _now_day)[2] >> _now_hour & 1)
+
+
+def todays_schedule(name: str) -> Dict[str, int]:
+    """Today's picked {"wake": hour, "sleep": hour} for `name`."""
+    _refresh_hour()
+    wake, sleep, _ = _entry(name, _now_day)
+    return {"wake": wake, "sleep": sleep}
+
+
+def next_transition(name: str) -> Optional[datetime]:
+    """When `name` next wakes up or falls asleep (AEDT), within two days."""
+    _refresh_hour()
+    today, tomorrow = _now_day, _now_day + timedelta(days=1)
+    bits = _entry(name, today)[2] | (_entry(name, tomorrow)[2] << 24)
+    current = bits >> _now_hour & 1
+    for h in range(_now_hour + 1, 48):
+        if (bits >> h & 1) != current:
+            day = today if h < 24 else tomorrow
+            return AEDT.localize(datetime(day.year, day.month, day.day, h % 24))
+    return None
+
+
+def seconds_until_transition(name: str) -> Optional[float]:
+    """Seconds until next_transition(name), for loops that sleep until then."""
+    at = next_transition(name)
+    return max(0.0, (at - datetime.now(AEDT)).total_seconds()) if at else None
+
+
+def get_schedule_stats() -> Dict:
+    _refresh_hour()
+    today = _day(_now_day)
+    return {
+        **_stats,
+        "today": {name: {"wake": w, "sleep": s, "online": bool(bits >> _now_hour & 1)}
+                  for name, (w, s, bits) in today.items()},
+    }
@@ -7,7 +7,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
 # ---------------------- Storage paths ----------------------
-DATA_DIR = "data"
+DATA_DIR = os.environ.get("SHARED_CONTEXT_DIR", "data")
 MEMORY_PATH = os.path.join(DATA_DIR, "shared_memories.json")
 MEDIA_PATH  = os.path.join(DATA_DIR, "media_catalog.json")
 
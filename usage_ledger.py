@@ -0,0 +1,165 @@
+# usage_ledger.py
+# Token / cost / latency accounting for every LLM call, tagged by persona
+# and call site (handler, chatter, random_sister_conversation, handle_dm, ...).
+#
+# - Rolling in-memory counters bucketed per hour (kept USAGE_KEEP_HOURS) and
+#   per day (kept USAGE_KEEP_DAYS), queried by /usage.
+# - A compact JSONL ledger on disk, one short record per call, appended in
+#   small batches and rotated by size like the main log.
+
+import os
+import json
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from logger import log_event
+
+USAGE_LEDGER_FILE = os.getenv("USAGE_LEDGER_FILE", "data/usage_ledger.jsonl")
+USAGE_LEDGER_MAX_BYTES = 5 * 1024 * 1024
+USAGE_FLUSH_EVERY = int(os.getenv("USAGE_FLUSH_EVERY", "20"))
+USAGE_FLUSH_S = float(os.getenv("USAGE_FLUSH_S", "60"))
+USAGE_KEEP_HOURS = 48
+USAGE_KEEP_DAYS = 30
+
+# USD per 1M tokens: (prompt, completion). Unknown models are costed at 0.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+_hourly: Dict[int, Dict[Tuple[str, str], Dict]] = {}
+_daily: Dict[int, Dict[Tuple[str, str], Dict]] = {}
+_pending: List[str] = []
+_last_flush = time.monotonic()
+
+
+def _cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    p_in, p_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * p_in + completion_tokens * p_out) / 1_000_000
+
+
+def _add(buckets: Dict, bucket: int, key: Tuple[str, str], row: Dict):
+    agg = buckets.setdefault(bucket, {}).setdefault(key, {
+        "calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+        "cached_tokens": 0, "cost_usd": 0.0, "latency_s": 0.0,
+    })
+    agg["calls"] += 1
+    agg["errors"] += 0 if row["ok"] else 1
+    agg["prompt_tokens"] += row["prompt_tokens"]
+    agg["completion_tokens"] += row["completion_tokens"]
+    agg["cached_tokens"] += row["cached_tokens"]
+    agg["cost_usd"] += row["cost_usd"]
+    agg["latency_s"] += row["latency_s"]
+
+
+def _prune(now: float):
+    for buckets, size, keep in ((_hourly, 3600, USAGE_KEEP_HOURS), (_daily, 86400, USAGE_KEEP_DAYS)):
+        oldest = int(now // size) - keep
+        for bucket in [b for b in buckets if b <= oldest]:
+            del buckets[bucket]
+
+
+def record_usage(
+    persona: str,
+    call_site: str,
+    model: str,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached_tokens: int = 0,
+    latency_s: float = 0.0,
+    ok: bool = True,
+):
+    """Account one LLM call."""
+    now = time.time()
+    row = {
+        "prompt_tokens": int(prompt_tokens or 0),
+        "completion_tokens": int(completion_tokens or 0),
+        "cached_tokens": int(cached_tokens or 0),
+        "cost_usd": _cost(model, prompt_tokens or 0, completion_tokens or 0),
+        "latency_s": latency_s,
+        "ok": ok,
+    }
+    key = (persona or "unknown", call_site or "unknown")
+    _add(_hourly, int(now // 3600), key, row)
+    _add(_daily, int(now // 86400), key, row)
+    _prune(now)
+
+    _pending.append(json.dumps({
+        "t": int(now), "p": key[0], "s": key[1], "m": model,
+        "pt": row["prompt_tokens"], "ct": row["completion_tokens"],
+        "ch": row["cached_tokens"], "ms": int(latency_s * 1000),
+        **({} if ok else {"err": 1}),
+    }, separators=(",", ":")))
+    if len(_pending) >= USAGE_FLUSH_EVERY or time.monotonic() - _last_flush >= USAGE_FLUSH_S:
+        flush_ledger()
+
+
+def record_response_usage(persona: str, call_site: str, model: str, usage, latency_s: float):
+    """record_usage() from an OpenAI `usage` object (may be None)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    record_usage(
+        persona,
+        call_site,
+        model,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+        latency_s=latency_s,
+    )
+
+
+def flush_ledger():
+    """Append buffered records to the ledger file (call on shutdown too)."""
+    global _last_flush
+    _last_flush = time.monotonic()
+    if not _pending:
+        return
+    lines = "\n".join(_pending) + "\n"
+    _pending.clear()
+    try:
+        os.makedirs(os.path.dirname(USAGE_LEDGER_FILE) or ".", exist_ok=True)
+        if os.path.exists(USAGE_LEDGER_FILE) and os.path.getsize(USAGE_LEDGER_FILE) > USAGE_LEDGER_MAX_BYTES:
+            stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+            os.rename(USAGE_LEDGER_FILE, f"{USAGE_LEDGER_FILE}.{stamp}")
+        with open(USAGE_LEDGER_FILE, "a", encoding="utf-8") as f:
+            f.write(lines)
+    except Exception as e:
+        log_event(f"[WARN] Usage ledger write failed: {e}")
+
+
+def get_usage(window: str = "hour", periods: int = 1, group_by: str = "persona") -> Dict:
+    """
+    Totals over the last `periods` hours or days, grouped by "persona",
+    "call_site" or "both".
+    """
+    buckets, size = (_daily, 86400) if window == "day" else (_hourly, 3600)
+    current = int(time.time() // size)
+    groups: Dict[str, Dict] = {}
+    total = {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+             "cached_tokens": 0, "cost_usd": 0.0, "latency_s": 0.0}
+    for bucket, rows in buckets.items():
+        if bucket <= current - max(1, periods):
+            continue
+        for (persona, site), agg in rows.items():
+            name = {"persona": persona, "call_site": site}.get(group_by, f"{persona}/{site}")
+            g = groups.setdefault(name, {k: 0 if k != "cost_usd" else 0.0 for k in total})
+            for k in total:
+                g[k] += agg[k]
+                total[k] += agg[k]
+
+    def _finish(g: Dict) -> Dict:
+        latency = g.pop("latency_s")
+        g["avg_latency_ms"] = round(1000 * latency / g["calls"], 1) if g["calls"] else None
+        g["cost_usd"] = round(g["cost_usd"], 6)
+        return g
+
+    return {
+        "window": window,
+        "periods": max(1, periods),
+        "group_by": group_by,
+        "total": _finish(total),
+        "groups": {name: _finish(g) for name, g in sorted(groups.items())},
+    }